@@ -0,0 +1,145 @@
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from generate_pricelist import generate_pricelist  # noqa: E402
+
+from pricelist_parser import PricelistParser  # noqa: E402
+
+baselines_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baselines')
+
+
+def parse_by_phases(path, **kwargs):
+    # Те же шаги, что и в parse_pricelist, но с замером времени каждого
+    extruder = PricelistParser().get_extruder(path, **kwargs)
+    timings = {}
+
+    if 'sheet_workers' in kwargs and kwargs['sheet_workers'] > 1:
+        # Листы разбираются одновременно, поэтому этапы по отдельности не замерить – только общее время
+        started = time.perf_counter()
+        items = list(extruder.iter_items(**kwargs))
+        timings['total'] = time.perf_counter() - started
+
+        return items, timings
+
+    started = time.perf_counter()
+    wb = extruder.load_file(path, **kwargs)
+    timings['load_file'] = time.perf_counter() - started
+
+    try:
+        started = time.perf_counter()
+        headers_map = extruder.get_headers_map(wb)
+        timings['detect_headers'] = time.perf_counter() - started
+
+        started = time.perf_counter()
+        items = [item for sheet_info in headers_map for item in extruder.iter_sheet_items(worksheet_info=sheet_info)]
+        timings['extract'] = time.perf_counter() - started
+    finally:
+        extruder.close()
+
+    timings['total'] = sum(timings.values())
+
+    return items, timings
+
+
+def measure_peak_memory(path, **kwargs):
+    tracemalloc.start()
+
+    try:
+        parse_by_phases(path, **kwargs)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def run_case(path, rows, repeat, **kwargs):
+    # Время – лучшее из repeat запусков, память меряем отдельным запуском, потому что tracemalloc замедляет разбор
+    best = None
+
+    for _ in range(repeat):
+        items, timings = parse_by_phases(path, **kwargs)
+
+        if len(items) != rows:
+            raise AssertionError(f'Expected {rows} items from {path}, got {len(items)}')
+
+        if best is None or timings['total'] < best['total']:
+            best = timings
+
+    return {
+        'rows': rows,
+        'rows_per_second': rows / best['total'],
+        'peak_memory_mb': measure_peak_memory(path, **kwargs) / 1024 / 1024,
+        'timings': best,
+    }
+
+
+def parse_option(option):
+    key, _, value = option.partition('=')
+
+    try:
+        return key, json.loads(value)
+    except ValueError:
+        return key, value
+
+
+def compare_with_baseline(results, baseline):
+    for case, result in results.items():
+        if case not in baseline:
+            continue
+
+        ratio = result['rows_per_second'] / baseline[case]['rows_per_second']
+        memory_ratio = result['peak_memory_mb'] / baseline[case]['peak_memory_mb']
+
+        print(f'{case:<20} throughput {ratio:6.2f}x   peak memory {memory_ratio:6.2f}x')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark parsing of synthetic pricelists')
+    parser.add_argument('--formats', nargs='+', default=['csv', 'xlsx', 'xls'])
+    parser.add_argument('--rows', nargs='+', type=int, default=[10000])
+    parser.add_argument('--sheets', type=int, default=3)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--option', action='append', default=[], help='Extruder option as key=value, e.g. read_only=true')
+    parser.add_argument('--save', help='Save results as a named baseline')
+    parser.add_argument('--compare', help='Compare results with a named baseline')
+    args = parser.parse_args()
+
+    options = dict(parse_option(option) for option in args.option)
+    results = {}
+
+    with tempfile.TemporaryDirectory() as directory:
+        for file_type in args.formats:
+            for rows in args.rows:
+                path = os.path.join(directory, f'pricelist_{rows}.{file_type}')
+
+                try:
+                    generate_pricelist(path, rows, sheets=args.sheets)
+                except ImportError as e:
+                    print(f'Skipping {file_type}: {e}')
+                    break
+
+                case = f'{file_type}-{rows}'
+                results[case] = result = run_case(path, rows, args.repeat, **options)
+                timings = '  '.join(f'{phase} {seconds:.3f}s' for phase, seconds in result['timings'].items())
+
+                print(f'{case:<20} {result["rows_per_second"]:>10.0f} rows/s  {result["peak_memory_mb"]:>8.1f} MB  {timings}')
+
+    if args.compare:
+        with open(os.path.join(baselines_path, args.compare + '.json'), 'r', encoding='utf-8') as file_object:
+            compare_with_baseline(results, json.load(file_object)['results'])
+
+    if args.save:
+        os.makedirs(baselines_path, exist_ok=True)
+
+        with open(os.path.join(baselines_path, args.save + '.json'), 'w', encoding='utf-8') as file_object:
+            json.dump({'options': options, 'results': results}, file_object, indent=2)
+
+
+if __name__ == '__main__':
+    main()
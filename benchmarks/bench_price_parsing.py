@@ -0,0 +1,53 @@
+import os
+import sys
+import timeit
+from price_parser import Price
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from pricelist_parser import XlsExtruder, XlsxExtruder  # noqa: E402
+from pricelist_parser.pricelist_item import _parse_price_string, parse_price  # noqa: E402
+
+samples_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'tests', 'samples')
+
+
+def collect_prices():
+    # Берем значения из всех столбцов с ценами в тестовых прайслистах
+    prices = []
+
+    for extruder_class, sample in [(XlsExtruder, 'sample.xls'), (XlsxExtruder, 'sample.xlsx')]:
+        extruder = extruder_class()
+        wb = extruder.load_file(os.path.join(samples_path, sample))
+
+        for sheet_info in extruder.get_headers_map(wb):
+            for header_info in sheet_info['headers']['headers']:
+                if header_info['type'] != 'price':
+                    continue
+
+                rows = extruder.iter_rows(sheet_info['worksheet'], start_row=sheet_info['headers']['row'] + 1, columns=[header_info['column']])
+                prices.extend(row[0] for row_idx, row in rows)
+
+    return prices
+
+
+def legacy_parse_price(value):
+    return Price.fromstring(str(value)).amount_float
+
+
+def main(repeat=20):
+    prices = collect_prices()
+
+    assert [legacy_parse_price(value) for value in prices] == [parse_price(value) for value in prices]
+
+    legacy = min(timeit.repeat(lambda: [legacy_parse_price(value) for value in prices], number=1, repeat=repeat))
+
+    _parse_price_string.cache_clear()
+    fast = min(timeit.repeat(lambda: [parse_price(value) for value in prices], number=1, repeat=repeat))
+
+    print(f'{len(prices)} price cells from sample sheets')
+    print(f'price_parser on every cell: {legacy * 1000:.2f} ms')
+    print(f'parse_price:                {fast * 1000:.2f} ms ({legacy / fast:.1f}x faster)')
+
+
+if __name__ == '__main__':
+    main()
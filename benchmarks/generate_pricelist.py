@@ -0,0 +1,204 @@
+import argparse
+import csv
+import os
+import random
+import re
+import shutil
+import zipfile
+
+# Генератор синтетических прайслистов, похожих на настоящие: несколько листов, мусорные строки перед заголовком,
+# строки-разделители разделов, пустые строки и цены в разных форматах. Все строки с товарами валидны,
+# поэтому разбор должен вернуть ровно столько товаров, сколько строк сгенерировано
+
+HEADER = ['№', 'Артикул', 'Наименование', 'Описание', 'Размеры', 'Вес', 'Кол-во', 'Цена']
+JUNK_ROWS = [
+    ['ООО «Поставщик сепулек»'],
+    ['Адрес: г. Москва, ул. Сепулькария, д. 1', None, None, 'тел.: +7 (495) 000-00-00'],
+    [],
+    ['Прайс-лист действителен до 31.12', None, None, None, None, 'Скидки по запросу'],
+    [],
+]
+XLS_MAX_ROWS = 65536
+
+
+def format_price(price, rng):
+    # Поставщики записывают цены как угодно: числами, строками с пробелами и запятыми, с валютой
+    variant = rng.randrange(6)
+
+    if variant == 0:
+        return price
+    if variant == 1:
+        return int(price)
+    if variant == 2:
+        return f'{price:,.2f}'.replace(',', ' ').replace('.', ',')
+    if variant == 3:
+        return f'{price:,.2f}'
+    if variant == 4:
+        return f'{int(price)} руб.'
+
+    return f'${price:.2f}'
+
+
+def generate_sheet_rows(rows, rng, start_number=1, section_size=50):
+    yield from JUNK_ROWS
+    yield HEADER
+
+    for offset in range(rows):
+        number = start_number + offset
+
+        if offset % section_size == 0:
+            yield [f'Раздел {number // section_size + 1}']
+
+            if rng.random() < 0.3:
+                yield []
+
+        price = round(rng.uniform(10, 100000), 2)
+
+        yield [
+            number,
+            f'{rng.choice("ABCDEFGHKMPT")}{rng.randrange(100, 999)}-{number:07d}',
+            f'Сепулька модели {number}',
+            rng.choice(['Обычная', 'Облегченная', 'Хитровывернутая по оси X', None]),
+            f'{rng.randrange(10, 500)}x{rng.randrange(10, 500)}x{rng.randrange(10, 500)}',
+            round(rng.uniform(0.1, 50), 1),
+            rng.randrange(0, 1000),
+            format_price(price, rng),
+        ]
+
+
+def generate_workbook(rows, sheets=3, seed=0, max_rows_per_sheet=None):
+    # Список листов (название, строки). Первый лист – справочный, без заголовков, товары делятся между остальными
+    rng = random.Random(seed)
+    data_sheets = max(sheets - 1, 1)
+
+    if max_rows_per_sheet is not None:
+        # С запасом на мусорные строки и разделители
+        data_sheets = max(data_sheets, -(-rows * 52 // 50 // (max_rows_per_sheet - 100)))
+
+    workbook = [('Информация', [['Прайс-лист поставщика сепулек'], [], ['Все цены указаны с НДС']])]
+    start_number = 1
+
+    for sheet_idx in range(data_sheets):
+        sheet_rows = rows // data_sheets + (1 if sheet_idx < rows % data_sheets else 0)
+        workbook.append((f'Прайс {sheet_idx + 1}', generate_sheet_rows(sheet_rows, rng, start_number=start_number)))
+        start_number += sheet_rows
+
+    return workbook
+
+
+def write_csv(path, rows, seed=0):
+    rng = random.Random(seed)
+
+    with open(path, 'w', encoding='utf-8', newline='') as file_object:
+        writer = csv.writer(file_object)
+        writer.writerows(generate_sheet_rows(rows, rng))
+
+
+def write_xlsx(path, rows, sheets=3, seed=0):
+    from openpyxl import Workbook
+
+    # write_only – строки сразу пишутся в файл, поэтому и прайслист на миллион строк не собирается в памяти
+    wb = Workbook(write_only=True)
+    dimensions = []
+
+    for title, sheet_rows in generate_workbook(rows, sheets=sheets, seed=seed):
+        ws = wb.create_sheet(title)
+        rows_num, cols_num = 0, 0
+
+        for row in sheet_rows:
+            ws.append(row)
+            rows_num += 1
+            cols_num = max(cols_num, len(row))
+
+        dimensions.append((rows_num, cols_num))
+
+    wb.save(path)
+    add_sheet_dimensions(path, dimensions)
+
+
+def add_sheet_dimensions(path, dimensions):
+    # В режиме write_only openpyxl не записывает размер листа (<dimension>), а Excel записывает всегда. Без него
+    # openpyxl в режиме read_only при открытии файла просматривает каждый лист целиком, и бенчмарки были бы
+    # непохожи на настоящие файлы. Поэтому дописываем размер в уже сохраненный файл, копируя архив потоком
+    from openpyxl.utils import get_column_letter
+
+    tmp_path = path + '.tmp'
+
+    with zipfile.ZipFile(path) as source, zipfile.ZipFile(tmp_path, 'w', zipfile.ZIP_DEFLATED) as target:
+        for info in source.infolist():
+            target_info = zipfile.ZipInfo(info.filename, date_time=info.date_time)
+            target_info.compress_type = zipfile.ZIP_DEFLATED
+            target_info.file_size = info.file_size
+            match = re.fullmatch(r'xl/worksheets/sheet(\d+)\.xml', info.filename)
+
+            with source.open(info) as source_file, target.open(target_info, 'w') as target_file:
+                if match is not None:
+                    rows_num, cols_num = dimensions[int(match.group(1)) - 1]
+                    head = source_file.read(4096)
+
+                    if rows_num > 0:
+                        # По схеме <dimension> идет сразу после <sheetPr>, а если его нет – первым в листе
+                        position = head.find(b'</sheetPr>')
+                        position = position + len(b'</sheetPr>') if position >= 0 else head.index(b'>', head.index(b'<worksheet')) + 1
+                        dimension = f'<dimension ref="A1:{get_column_letter(max(cols_num, 1))}{rows_num}" />'.encode()
+                        head = head[:position] + dimension + head[position:]
+
+                    target_file.write(head)
+
+                shutil.copyfileobj(source_file, target_file)
+
+    os.replace(tmp_path, path)
+
+
+def write_xls(path, rows, sheets=3, seed=0):
+    try:
+        import xlwt
+    except ImportError:
+        raise ImportError('Writing xls files requires xlwt. Please install it with `pip install xlwt`')
+
+    wb = xlwt.Workbook(encoding='utf-8')
+
+    # В xls на листе не больше 65536 строк, поэтому большие прайслисты раскладываем на несколько листов
+    for title, sheet_rows in generate_workbook(rows, sheets=sheets, seed=seed, max_rows_per_sheet=XLS_MAX_ROWS):
+        ws = wb.add_sheet(title)
+
+        for row_idx, row in enumerate(sheet_rows):
+            for col_idx, value in enumerate(row):
+                if value is not None:
+                    ws.write(row_idx, col_idx, value)
+
+    wb.save(path)
+
+
+WRITERS = {
+    'csv': lambda path, rows, sheets, seed: write_csv(path, rows, seed=seed),
+    'xlsx': write_xlsx,
+    'xls': write_xls,
+}
+
+
+def generate_pricelist(path, rows, file_type=None, sheets=3, seed=0):
+    file_type = file_type or os.path.splitext(path)[1].lstrip('.')
+
+    if file_type not in WRITERS:
+        raise ValueError(f'Unsupported file type {file_type}. Please use one of xls, xlsx or csv instead')
+
+    WRITERS[file_type](path, rows, sheets, seed)
+
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate a synthetic pricelist')
+    parser.add_argument('path')
+    parser.add_argument('--rows', type=int, default=10000)
+    parser.add_argument('--sheets', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--format', dest='file_type', choices=sorted(WRITERS.keys()))
+    args = parser.parse_args()
+
+    generate_pricelist(args.path, args.rows, file_type=args.file_type, sheets=args.sheets, seed=args.seed)
+
+
+if __name__ == '__main__':
+    main()
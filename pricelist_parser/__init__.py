@@ -3,6 +3,15 @@ __email__ = 'artem.kiselev@gmail.com'
 __version__ = '0.2'
 
 
+from .budget import BudgetExceeded, ParseBudget
+from .cache import PricelistCache
+from .columns import PricelistColumns
+from .compare import PriceComparison, compare_prices
+from .diff import PricelistChange, PricelistSnapshot, diff_pricelist
 from .extruders import CsvExtruder, Extruder, XlsExtruder, XlsxExtruder
-from .parser import PricelistParser, parse_pricelist
+from .index import SkuIndex
+from .layouts import LayoutStore
+from .parser import PricelistParser, aiter_pricelist, iter_pricelist, parse_pricelist, parse_pricelist_async
+from .pool import ValuePool
 from .pricelist_item import PricelistParserItem
+from .stats import ParseStats
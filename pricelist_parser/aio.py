@@ -0,0 +1,43 @@
+import asyncio
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+
+async def aiter_blocking(iterable_factory, executor=None, chunk_size=100):
+    # Читает блокирующий итератор в executor пачками по chunk_size. Следующая пачка запрашивается только после того,
+    # как потребитель разобрал предыдущую, поэтому товары не копятся в памяти быстрее, чем их успевают обработать
+    if isinstance(executor, ProcessPoolExecutor):
+        raise ValueError('Streaming requires a thread executor, process executors can only return complete results')
+
+    loop = asyncio.get_running_loop()
+    lock = threading.Lock()
+    iterator = None
+
+    def next_chunk():
+        nonlocal iterator
+
+        with lock:
+            if iterator is None:
+                iterator = iter(iterable_factory())
+
+            return list(islice(iterator, chunk_size))
+
+    def close():
+        with lock:
+            if iterator is not None and hasattr(iterator, 'close'):
+                iterator.close()
+
+    try:
+        while True:
+            chunk = await loop.run_in_executor(executor, next_chunk)
+
+            if len(chunk) == 0:
+                break
+
+            for item in chunk:
+                yield item
+    finally:
+        # Если итерацию прервали, файл закрывается в executor после того, как дочитается текущая пачка.
+        # Дожидаемся закрытия, чтобы его ошибки дошли до потребителя
+        await loop.run_in_executor(executor, close)
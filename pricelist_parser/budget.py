@@ -0,0 +1,178 @@
+import math
+import multiprocessing
+import os
+import sys
+import time
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+
+class BudgetExceeded(Exception):
+    # Разбор файла превысил один из лимитов ParseBudget: limit – название лимита, value – сколько набралось
+    def __init__(self, limit, value, maximum):
+        super().__init__(limit, value, maximum)
+        self.limit = limit
+        self.value = value
+        self.maximum = maximum
+
+    def __str__(self):
+        return f'Parse budget exceeded: {self.limit} is {self.value}, the limit is {self.maximum}'
+
+
+class ParseBudget(object):
+    # Лимиты на разбор одного файла: время в секундах, число прочитанных строк и ячеек (вместе с поиском заголовков)
+    # и память процесса в байтах. Время и память проверяются раз в check_every строк. Если partial=True,
+    # при превышении лимита разбор останавливается и возвращается то, что успели извлечь, иначе – BudgetExceeded
+    def __init__(self, max_seconds=None, max_rows=None, max_cells=None, max_memory=None, partial=False, check_every=1000):
+        self.max_seconds = max_seconds
+        self.max_rows = max_rows
+        self.max_cells = max_cells
+        self.max_memory = max_memory
+        self.partial = partial
+        self.check_every = check_every
+
+    def start(self, shared=None):
+        # Лимиты общие, а счетчики у каждого разбора свои. shared – счетчики разбора, который идет в нескольких процессах
+        return BudgetTracker(self, shared=shared)
+
+
+class SharedBudgetCounters(object):
+    # Счетчики строк и ячеек одного разбора, общие для процессов, которые разбирают листы файла параллельно,
+    # чтобы лимиты действовали на весь файл, а не на каждый процесс. Передаются в процессы при их запуске
+    def __init__(self, budget, started):
+        self.started = started
+        self._max_rows = budget.max_rows if budget.max_rows is not None else math.inf
+        self._max_cells = budget.max_cells if budget.max_cells is not None else math.inf
+        # Строки, ячейки и признак того, что разбор пора остановить
+        self._values = multiprocessing.Array('q', 3)
+
+    def add(self, cells):
+        # Засчитывает строку и возвращает счетчики всего разбора или None, если разбор уже остановлен.
+        # Остановку отмечаем под той же блокировкой, чтобы другие процессы не засчитали строки сверх лимита
+        with self._values.get_lock():
+            values = self._values
+
+            if values[2]:
+                return None
+
+            values[0] += 1
+            values[1] += cells
+
+            if values[0] > self._max_rows or values[1] > self._max_cells:
+                values[2] = 1
+
+            return values[0], values[1]
+
+    def stop(self):
+        with self._values.get_lock():
+            self._values[2] = 1
+
+    @property
+    def rows(self):
+        return self._values[0]
+
+    @property
+    def cells(self):
+        return self._values[1]
+
+
+class BudgetTracker(object):
+    def __init__(self, budget, shared=None):
+        self.budget = budget
+        self.shared = shared
+        self.started = shared.started if shared is not None else time.monotonic()
+        self.rows = 0
+        self.cells = 0
+        self.exceeded = None
+        self._max_rows = budget.max_rows if budget.max_rows is not None else math.inf
+        self._max_cells = budget.max_cells if budget.max_cells is not None else math.inf
+        self._next_check = 0
+
+    def share(self):
+        # Счетчики для процессов, которые продолжат этот разбор
+        if self.shared is None:
+            self.shared = SharedBudgetCounters(self.budget, self.started)
+
+        return self.shared
+
+    def update_shared(self):
+        # Забирает счетчики, которые набрали процессы
+        if self.shared is not None:
+            self.rows, self.cells = self.shared.rows, self.shared.cells
+
+    def limit(self, rows):
+        # Пропускает строки, пока не превышен ни один лимит
+        shared = self.shared
+
+        for row_idx, row in rows:
+            if self.exceeded is not None:
+                return
+
+            if shared is None:
+                self.rows += 1
+                self.cells += len(row)
+            else:
+                counters = shared.add(len(row))
+
+                # Лимит превысил другой процесс, ошибку вернет он
+                if counters is None:
+                    return
+
+                self.rows, self.cells = counters
+
+            if self.rows > self._max_rows or self.cells > self._max_cells or self.rows >= self._next_check:
+                self._next_check = self.rows + self.budget.check_every
+                error = self.get_error()
+
+                if error is not None:
+                    if shared is not None:
+                        shared.stop()
+
+                    if not self.budget.partial:
+                        raise error
+
+                    self.exceeded = error
+                    return
+
+            yield row_idx, row
+
+    def get_error(self):
+        if self.rows > self._max_rows:
+            return BudgetExceeded('max_rows', self.rows, self.budget.max_rows)
+
+        if self.cells > self._max_cells:
+            return BudgetExceeded('max_cells', self.cells, self.budget.max_cells)
+
+        if self.budget.max_seconds is not None:
+            elapsed = time.monotonic() - self.started
+
+            if elapsed > self.budget.max_seconds:
+                return BudgetExceeded('max_seconds', elapsed, self.budget.max_seconds)
+
+        if self.budget.max_memory is not None:
+            memory = get_memory_usage()
+
+            if memory is not None and memory > self.budget.max_memory:
+                return BudgetExceeded('max_memory', memory, self.budget.max_memory)
+
+        return None
+
+
+def get_memory_usage():
+    # Текущий объем резидентной памяти процесса в байтах. Где /proc нет, берем пиковый объем из getrusage
+    try:
+        with open('/proc/self/statm', 'r') as file_object:
+            return int(file_object.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        pass
+
+    if resource is None:
+        return None
+
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    # В macOS ru_maxrss в байтах, в остальных системах – в килобайтах
+    return max_rss if sys.platform == 'darwin' else max_rss * 1024
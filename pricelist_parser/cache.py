@@ -0,0 +1,250 @@
+import hashlib
+import json
+import os
+import tempfile
+import time
+import zlib
+from datetime import date, datetime
+from datetime import time as datetime_time
+from datetime import timedelta
+
+from .pricelist_item import PricelistParserItem
+from .sources import is_buffer, is_path
+
+
+def encode_value(value):
+    # Кроме строк, чисел и None в ячейках бывают только даты и время. Их записываем словарями с типом:
+    # сами значения ячеек словарями не бывают
+    if isinstance(value, datetime):
+        return {'__type__': 'datetime', 'value': value.isoformat()}
+
+    if isinstance(value, date):
+        return {'__type__': 'date', 'value': value.isoformat()}
+
+    if isinstance(value, datetime_time):
+        return {'__type__': 'time', 'value': value.isoformat()}
+
+    if isinstance(value, timedelta):
+        return {'__type__': 'timedelta', 'value': [value.days, value.seconds, value.microseconds]}
+
+    raise TypeError(f'Object of type {type(value).__name__} can not be cached')
+
+
+def decode_value(value):
+    if '__type__' not in value:
+        return value
+
+    if value['__type__'] == 'datetime':
+        return datetime.fromisoformat(value['value'])
+
+    if value['__type__'] == 'date':
+        return date.fromisoformat(value['value'])
+
+    if value['__type__'] == 'time':
+        return datetime_time.fromisoformat(value['value'])
+
+    if value['__type__'] == 'timedelta':
+        return timedelta(*value['value'])
+
+    raise ValueError(f'Unknown cached value type {value["__type__"]}')
+
+
+class PricelistCache(object):
+    # Кэш разобранных прайслистов на диске. Ключ – хэш содержимого файла вместе с подписями заголовков,
+    # параметрами разбора и версией библиотеки, поэтому повторно присланный тот же файл не разбирается заново.
+    # Каждая запись пишется во временный файл и атомарно переименовывается, так что кэш можно делить между процессами.
+    # Записи хранятся в JSON, а не в pickle: каталог может быть общим, и чужая запись не должна выполнять код
+    suffix = '.pricelist'
+
+    # Параметры, которые меняют только способ чтения файла, но не результат, в ключ не попадают
+    ignored_options = ('read_only', 'use_mmap', 'on_demand', 'sheet_workers', 'sheet_executor', 'layout', 'stats', 'budget', 'intern_values', 'value_pool')
+
+    # Каталог целиком просматривается не на каждую запись, а раз в evict_every записей или когда записанное
+    # с прошлого просмотра превысило max_size. Записи других процессов видны только при просмотре, поэтому
+    # кэш может ненадолго превышать лимит. Временные файлы старше stale_temporary_age секунд остались от упавших
+    # процессов и тоже удаляются при просмотре
+    evict_every = 100
+    stale_temporary_age = 3600
+
+    def __init__(self, directory, max_size=None, max_age=None):
+        # max_size – предельный размер кэша в байтах, max_age – время жизни записи в секундах
+        self.directory = directory
+        self.max_size = max_size
+        self.max_age = max_age
+        # Размер кэша по последнему просмотру вместе с тем, что записано после него
+        self._size = None
+        self._writes = 0
+
+        os.makedirs(directory, exist_ok=True)
+
+    def get_key(self, source, header_signatures, options=None):
+        from . import __version__
+
+        digest = hashlib.sha256()
+
+        for chunk in self._iter_content(source):
+            digest.update(chunk)
+
+        digest.update(json.dumps({
+            'version': __version__,
+            'header_signatures': header_signatures,
+            'options': options or {},
+        }, sort_keys=True, default=str).encode('utf-8'))
+
+        return digest.hexdigest()
+
+    def get(self, key):
+        path = self._get_path(key)
+
+        try:
+            if self.max_age is not None and time.time() - os.path.getmtime(path) > self.max_age:
+                self._remove(path)
+                return None
+
+            with open(path, 'rb') as file_object:
+                content = json.loads(zlib.decompress(file_object.read()), object_hook=decode_value)
+
+            keys = [tuple(keys) for keys in content['keys']]
+            items = [self._restore_item(keys[keys_idx], values) for keys_idx, values in content['rows']]
+
+            # Отмечаем запись как недавно использованную, чтобы при вытеснении она удалялась последней
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        except (OSError, zlib.error, ValueError, TypeError, KeyError, IndexError):
+            self._remove(path)
+            return None
+
+        return items
+
+    def set(self, key, items):
+        # Одинаковые наборы полей записываем один раз, а в строках храним только их номер
+        keys_index = {}
+        rows = []
+
+        for item in items:
+            keys = tuple(item.keys())
+            rows.append((keys_index.setdefault(keys, len(keys_index)), [item[field] for field in keys]))
+
+        try:
+            content = json.dumps({'keys': list(keys_index), 'rows': rows}, default=encode_value, ensure_ascii=False, separators=(',', ':'))
+        except TypeError:
+            # Значения, которые не записать в JSON, в кэш не попадают
+            return
+
+        content = zlib.compress(content.encode('utf-8'))
+
+        file_descriptor, temporary_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+
+        try:
+            with os.fdopen(file_descriptor, 'wb') as file_object:
+                file_object.write(content)
+
+            os.replace(temporary_path, self._get_path(key))
+        except BaseException:
+            self._remove(temporary_path)
+            raise
+
+        self._writes += 1
+
+        if self._size is not None:
+            self._size += len(content)
+
+        if self.needs_eviction():
+            self.evict()
+
+    def needs_eviction(self):
+        if self._writes >= self.evict_every:
+            return True
+
+        if self.max_size is None:
+            return False
+
+        # Размер каталога еще не знаем или записанное могло превысить лимит
+        return self._size is None or self._size > self.max_size
+
+    def evict(self):
+        entries = []
+        now = time.time()
+
+        for name in os.listdir(self.directory):
+            is_temporary = name.endswith('.tmp')
+
+            if not is_temporary and not name.endswith(self.suffix):
+                continue
+
+            path = os.path.join(self.directory, name)
+
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                # Запись уже удалил другой процесс
+                continue
+
+            if is_temporary:
+                if now - stat.st_mtime > self.stale_temporary_age:
+                    self._remove(path)
+            elif self.max_age is not None and now - stat.st_mtime > self.max_age:
+                self._remove(path)
+            else:
+                entries.append((stat.st_mtime, stat.st_size, path))
+
+        total_size = sum(size for mtime, size, path in entries)
+        self._writes = 0
+        self._size = total_size
+
+        if self.max_size is None:
+            return
+
+        # Удаляем самые давно использованные записи, пока кэш не уложится в лимит
+        for mtime, size, path in sorted(entries):
+            if total_size <= self.max_size:
+                break
+
+            self._remove(path)
+            total_size -= size
+
+        self._size = total_size
+
+    def clear(self):
+        for name in os.listdir(self.directory):
+            if name.endswith(self.suffix):
+                self._remove(os.path.join(self.directory, name))
+
+        self._size = 0
+        self._writes = 0
+
+    def _get_path(self, key):
+        return os.path.join(self.directory, key + self.suffix)
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    @staticmethod
+    def _restore_item(keys, values):
+        # Значения уже обработаны при разборе, поэтому конструктор (и разбор цены) не вызываем
+        item = PricelistParserItem.__new__(PricelistParserItem)
+        item.__setstate__(dict(zip(keys, values)))
+
+        return item
+
+    @staticmethod
+    def _iter_content(source, chunk_size=1024 * 1024):
+        if is_path(source):
+            with open(source, 'rb') as file_object:
+                yield from iter(lambda: file_object.read(chunk_size), b'')
+        elif is_buffer(source):
+            yield memoryview(source)
+        else:
+            position = source.tell()
+            source.seek(0)
+
+            try:
+                for chunk in iter(lambda: source.read(chunk_size), source.read(0)):
+                    yield chunk.encode('utf-8') if isinstance(chunk, str) else chunk
+            finally:
+                source.seek(position)
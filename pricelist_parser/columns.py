@@ -0,0 +1,131 @@
+from .pricelist_item import parse_price, parse_sku
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+class PricelistColumns(object):
+    # Результат разбора в виде столбцов: по одному массиву на каждый тип заголовка и маска валидных строк.
+    # Строки копятся в обычных списках и превращаются в массивы NumPy только при обращении
+    def __init__(self):
+        if np is None:
+            raise ImportError('Columnar results require numpy. Please install it with `pip install pricelist-parser[columns]`')
+
+        self._columns = {'sku': [], 'price': []}
+        self._valid = []
+        self._length = 0
+        self._arrays = None
+        self._valid_array = None
+
+    def append_rows(self, column_types, rows):
+        # Если тип встречается в строке заголовков несколько раз, побеждает последний столбец – как и у товаров
+        positions = {column_type: position for position, column_type in enumerate(column_types)}
+
+        for column_type in positions:
+            if column_type not in self._columns:
+                self._columns[column_type] = [None] * self._length
+
+        sku_column = self._columns['sku']
+        price_column = self._columns['price']
+        sku_position = positions.get('sku')
+        price_position = positions.get('price')
+        other_columns = [(self._columns[column_type], position) for column_type, position in positions.items() if column_type not in ('sku', 'price')]
+        valid = self._valid
+
+        appended = 0
+        for row in rows:
+            sku = parse_sku(row[sku_position]) if sku_position is not None else None
+            price = parse_price(row[price_position]) if price_position is not None else None
+
+            sku_column.append(sku)
+            price_column.append(price)
+            valid.append(price is not None and bool(sku))
+
+            for column, position in other_columns:
+                column.append(row[position])
+
+            appended += 1
+
+        # Столбцы, которых нет на этом листе, дополняем пустыми значениями
+        for column_type, column in self._columns.items():
+            if column_type not in positions and column_type not in ('sku', 'price'):
+                column.extend([None] * appended)
+
+        self._length += appended
+        self._arrays = None
+
+        return self
+
+    @property
+    def arrays(self):
+        if self._arrays is None:
+            self._build_arrays()
+
+        return self._arrays
+
+    @property
+    def valid(self):
+        if self._arrays is None:
+            self._build_arrays()
+
+        return self._valid_array
+
+    def keys(self):
+        return self._columns.keys()
+
+    def __getitem__(self, key):
+        return self.arrays[key]
+
+    def __len__(self):
+        return self._length
+
+    def to_dict(self, valid_only=False):
+        if valid_only:
+            return {column_type: array[self.valid] for column_type, array in self.arrays.items()}
+
+        return dict(self.arrays)
+
+    def to_pandas(self, valid_only=False):
+        import pandas
+
+        return pandas.DataFrame(self.to_dict(valid_only=valid_only), copy=False)
+
+    def to_arrow(self, valid_only=False):
+        import pyarrow
+
+        arrays = {}
+        for column_type, array in self.to_dict(valid_only=valid_only).items():
+            if array.dtype != object:
+                # Числовые массивы Arrow забирает без копирования
+                arrays[column_type] = pyarrow.array(array)
+                continue
+
+            try:
+                arrays[column_type] = pyarrow.array(array, from_pandas=True)
+            except pyarrow.ArrowException:
+                # В столбце вперемешку строки и числа – приводим всё к строкам
+                arrays[column_type] = pyarrow.array([None if value is None else str(value) for value in array])
+
+        return pyarrow.table(arrays)
+
+    def _build_arrays(self):
+        arrays = {}
+
+        for column_type, column in self._columns.items():
+            if column_type == 'price':
+                # None превращается в NaN
+                arrays[column_type] = np.array(column, dtype=np.float64)
+            else:
+                arrays[column_type] = self._as_object_array(column)
+
+        self._valid_array = np.array(self._valid, dtype=bool)
+        self._arrays = arrays
+
+    @staticmethod
+    def _as_object_array(values):
+        array = np.empty(len(values), dtype=object)
+        array[:] = values
+
+        return array
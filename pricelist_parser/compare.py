@@ -0,0 +1,112 @@
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+class PriceComparison(object):
+    # Цены одного артикула у разных поставщиков. Строка – артикул, все показатели – массивы NumPy одной длины:
+    # sku, min, max, median, spread (max - min), cheapest (slug самого дешевого источника) и count (у скольких
+    # источников есть артикул). prices – матрица цен артикул × источник, NaN там, где у источника артикула нет
+    def __init__(self, sources, skus, prices):
+        self.sources = sources
+        self.prices = prices
+
+        if len(sources) == 0 or len(skus) == 0:
+            # Без источников или артикулов сравнивать нечего, а свертки по пустой оси NumPy не считает
+            self.arrays = {
+                'sku': skus,
+                'min': np.empty(0),
+                'max': np.empty(0),
+                'median': np.empty(0),
+                'spread': np.empty(0),
+                'cheapest': np.empty(0, dtype=object),
+                'count': np.empty(0, dtype=np.intp),
+            }
+            return
+
+        counts = np.count_nonzero(~np.isnan(prices), axis=1)
+        minimums = np.nanmin(prices, axis=1)
+        maximums = np.nanmax(prices, axis=1)
+
+        self.arrays = {
+            'sku': skus,
+            'min': minimums,
+            'max': maximums,
+            'median': np.nanmedian(prices, axis=1),
+            'spread': maximums - minimums,
+            'cheapest': np.asarray(sources, dtype=object)[np.nanargmin(prices, axis=1)],
+            'count': counts,
+        }
+
+    def keys(self):
+        return self.arrays.keys()
+
+    def __getitem__(self, key):
+        return self.arrays[key]
+
+    def __len__(self):
+        return len(self.arrays['sku'])
+
+    def to_dict(self):
+        return dict(self.arrays)
+
+    def to_pandas(self):
+        import pandas
+
+        return pandas.DataFrame(self.to_dict(), copy=False)
+
+
+def compare_prices(data_sources, min_sources=1):
+    # Сравнивает цены одних и тех же артикулов у всех источников парсера. data_sources – PricelistParser или словарь
+    # slug → экструдер (или список товаров). Если артикул повторяется в одном файле, берется минимальная цена.
+    # min_sources – сколько источников должно продавать артикул, чтобы он попал в сравнение
+    if np is None:
+        raise ImportError('Price comparison requires numpy. Please install it with `pip install pricelist-parser[columns]`')
+
+    if hasattr(data_sources, 'data_sources'):
+        data_sources = data_sources.data_sources
+
+    sources = list(data_sources.keys())
+    all_skus = []
+    price_parts = []
+
+    for items in data_sources.values():
+        items = getattr(items, 'items', items)
+
+        all_skus.extend(item.sku for item in items)
+        price_parts.append(np.fromiter((item.price for item in items), dtype=np.float64, count=len(items)))
+
+    lengths = [len(part) for part in price_parts]
+    source_indexes = np.repeat(np.arange(len(sources)), lengths)
+
+    if len(all_skus) == 0:
+        return PriceComparison(sources, np.array([], dtype=object), np.empty((0, len(sources))))
+
+    # Выравниваем все источники по артикулу: номер строки матрицы – номер артикула среди уникальных
+    skus, sku_indexes = factorize(all_skus)
+    prices = np.full((len(skus), len(sources)), np.inf)
+    np.fmin.at(prices, (sku_indexes, source_indexes), np.concatenate(price_parts))
+    prices[np.isinf(prices)] = np.nan
+
+    if min_sources > 1:
+        selected = np.count_nonzero(~np.isnan(prices), axis=1) >= min_sources
+        skus, prices = skus[selected], prices[selected]
+
+    return PriceComparison(sources, skus, prices)
+
+
+def factorize(values):
+    # Отсортированные уникальные значения и номер уникального значения для каждого элемента. Сортируем, чтобы
+    # порядок артикулов не зависел от того, установлен ли pandas. pandas находит уникальные значения через
+    # хэш-таблицу и сортирует только их, а не все строки, поэтому используем его, если он установлен
+    try:
+        import pandas
+    except ImportError:
+        uniques, codes = np.unique(np.array(values, dtype=str), return_inverse=True)
+
+        return uniques.astype(object), codes
+
+    codes, uniques = pandas.factorize(np.array(values, dtype=object), sort=True)
+
+    return np.asarray(uniques, dtype=object), codes
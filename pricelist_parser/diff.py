@@ -0,0 +1,61 @@
+from collections import namedtuple
+
+from .parser import iter_pricelist
+
+# kind – added, removed или changed. old – сравниваемые поля из прошлой версии, new – товар из новой
+PricelistChange = namedtuple('PricelistChange', ['kind', 'sku', 'old', 'new'])
+
+
+class PricelistSnapshot(dict):
+    # Прошлая версия прайслиста в компактном виде: для каждого артикула только поля, изменения которых нас интересуют.
+    # Это обычный словарь, его можно сохранить в JSON или pickle и передать в diff_pricelist при следующей загрузке
+    def __init__(self, fields=('price',), *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields = tuple(fields)
+
+    @classmethod
+    def from_items(cls, items, fields=('price',)):
+        snapshot = cls(fields)
+
+        for item in items:
+            snapshot.add(item)
+
+        return snapshot
+
+    def add(self, item):
+        # Если артикул повторяется, в снимке остается первый товар – так же, как при сравнении
+        if item.sku not in self:
+            self[item.sku] = self.get_values(item)
+
+    def get_values(self, item):
+        return {field: item[field] if field in item.keys() else None for field in self.fields}
+
+
+def diff_pricelist(previous, pricelist_file, fields=('price',), snapshot=None, **kwargs):
+    # Сравнивает новую версию прайслиста с прошлой и отдает только изменения: сначала новые и изменившиеся товары
+    # по мере чтения файла, затем пропавшие. previous – товары прошлой версии или PricelistSnapshot.
+    # Если передан snapshot, в него записывается снимок новой версии для следующего сравнения
+    if not isinstance(previous, PricelistSnapshot):
+        previous = PricelistSnapshot.from_items(previous, fields=fields)
+
+    current = PricelistSnapshot(previous.fields) if snapshot is None else snapshot
+
+    for item in iter_pricelist(pricelist_file, **kwargs):
+        # Повторы артикула внутри файла не сравниваем, учитывается первый товар
+        if item.sku in current:
+            continue
+
+        current.add(item)
+
+        if item.sku not in previous:
+            yield PricelistChange('added', item.sku, None, item)
+            continue
+
+        old_values = previous[item.sku]
+
+        if previous.get_values(item) != old_values:
+            yield PricelistChange('changed', item.sku, old_values, item)
+
+    for sku, old_values in previous.items():
+        if sku not in current:
+            yield PricelistChange('removed', sku, old_values, None)
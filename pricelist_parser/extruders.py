@@ -1,9 +1,21 @@
+import codecs
 import csv
+import re
+import time
 import xlrd
 from abc import abstractmethod
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import lru_cache
+from itertools import islice
 from openpyxl import load_workbook
 
-from .pricelist_item import PricelistParserItem
+from .columns import PricelistColumns
+from .layouts import header_fingerprint, signatures_fingerprint
+from .pool import ValuePool
+from .pricelist_item import PricelistParserItem, parse_price
+from .sources import detect_encoding, is_path, open_binary, open_text, read_bytes, read_head
+from .stats import ParseStats
+from .xlsx_reader import XlsxReader
 
 header_signatures = {
     'sku': ['код', 'артикул', 'модель', 'штрих-код'],
@@ -19,126 +31,693 @@ header_signatures = {
 }
 
 
+# Заголовки короткие и повторяются от листа к листу, а длинные строки – это описания товаров, которые при поиске
+# заголовков по всему листу только вытеснили бы заголовки из кэша и держали бы память до конца процесса
+MAX_CACHED_HEADER_LENGTH = 64
+
+
+def normalize_cell_value(cell_value):
+    # Числа и даты заголовками не бывают, их не кэшируем
+    if type(cell_value) is not str:
+        return str(cell_value).lower().strip()
+
+    if len(cell_value) > MAX_CACHED_HEADER_LENGTH:
+        return cell_value.lower().strip()
+
+    return _normalize_header(cell_value)
+
+
+@lru_cache(maxsize=4096)
+def _normalize_header(cell_value):
+    return cell_value.lower().strip()
+
+
+def compile_header_signatures(signatures):
+    # Собираем все сигнатуры в одно регулярное выражение. Каждый тип заголовка – отдельная ветка альтернативы
+    # с опережающей проверкой, поэтому, как и раньше, побеждает первый подходящий тип в порядке словаря
+    header_types = []
+    branches = []
+
+    for header_type, substrings in signatures.items():
+        if len(substrings) == 0:
+            continue
+
+        group = f'h{len(header_types)}'
+        alternatives = '|'.join(re.escape(substring) for substring in substrings)
+        branches.append(f'(?=.*?(?:{alternatives}))(?P<{group}>)')
+        header_types.append(header_type)
+
+    if len(branches) == 0:
+        # Выражение, которое никогда не совпадает
+        return re.compile('(?!)'), header_types
+
+    return re.compile('|'.join(branches), re.DOTALL), header_types
+
+
+def get_dialect_params(dialect):
+    # Параметры формата CSV обычным словарем: класс, который возвращает csv.Sniffer, нельзя передать в другой процесс
+    return {
+        'delimiter': dialect.delimiter,
+        'quotechar': dialect.quotechar,
+        'doublequote': dialect.doublequote,
+        'skipinitialspace': dialect.skipinitialspace,
+        'quoting': dialect.quoting,
+    }
+
+
+def pick_columns(row, columns):
+    # Выбирает из строки только нужные столбцы (нумерация с единицы). Недостающие ячейки считаем пустыми
+    if columns is None:
+        return row
+
+    row_length = len(row)
+
+    return [row[col_idx - 1] if col_idx <= row_length else None for col_idx in columns]
+
+
+def is_empty_row(row):
+    for value in row:
+        if value is not None and (type(value) is not str or value.strip() != ''):
+            return False
+
+    return True
+
+
 class Extruder(object):
     required_headers = ['sku', 'price']
+    # Сколько первых строк листа просматривать в поисках заголовков. None – всегда просматривать лист целиком
+    header_probe_rows = 50
+    # Сколько листов разбирать одновременно в load_data и чем: потоками (thread) или процессами (process)
+    sheet_workers = None
+    sheet_executor = 'thread'
+    # После скольких пустых строк подряд считать, что таблица закончилась. None – читать лист до конца
+    max_empty_rows = None
+    # Можно ли читать строки листа в любом порядке, а не только потоком от начала к концу
+    random_access = True
+    # Время разбора цен замеряется на каждой price_sample_every-й строке и пересчитывается на весь лист
+    price_sample_every = 100
+    # Настройки разбора, которые передаются процессам, разбирающим часть листов
+    worker_settings = ('budget', 'header_probe_rows', 'max_empty_rows')
 
     def __init__(self, source_file=None, **kwargs):
+        if 'header_probe_rows' in kwargs:
+            self.header_probe_rows = kwargs['header_probe_rows']
+
+        if 'max_empty_rows' in kwargs:
+            self.max_empty_rows = kwargs['max_empty_rows']
+
+        if 'sheet_workers' in kwargs:
+            self.sheet_workers = kwargs['sheet_workers']
+
+        if 'sheet_executor' in kwargs:
+            self.sheet_executor = kwargs['sheet_executor']
+
+        # Раскладка файла, найденная при прошлом разборе. После разбора здесь раскладка текущего файла
+        self.layout = kwargs['layout'] if 'layout' in kwargs else None
+        # Время этапов и счетчики разбора. Можно передать свой ParseStats, например с hooks
+        self.stats = kwargs['stats'] if 'stats' in kwargs else ParseStats()
+        # Лимиты на разбор файла (ParseBudget) и счетчики текущего разбора
+        self.budget = kwargs['budget'] if 'budget' in kwargs else None
+        self.budget_tracker = None
+        # Пул для повторяющихся строк из столбцов, кроме артикула и цены: свой (intern_values=True) или общий
+        # на несколько файлов (value_pool)
+        self.value_pool = kwargs['value_pool'] if 'value_pool' in kwargs else None
+
+        if self.value_pool is None and 'intern_values' in kwargs and kwargs['intern_values']:
+            self.value_pool = ValuePool()
+
         self.items = []
+        self.from_cache = False
         self.loaded_file = None
-        self.header_signatures = header_signatures.copy()
+        self.header_signatures = {key: list(value) for key, value in header_signatures.items()}
         self.source_file = source_file
+        self._header_matcher = None
+        self._header_types = []
 
     def update_header_signatures(self, signatures, replace=False):
         for key, signature in signatures.items():
             if key in self.header_signatures.keys() and not replace:
                 self.header_signatures[key] += signature
             else:
-                self.header_signatures[key] = signature
+                self.header_signatures[key] = list(signature)
+
+        # Сигнатуры поменялись – пересоберем матчер при следующем обращении
+        self._header_matcher = None
 
     def load_data(self, **kwargs):
-        wb = self.load_file(self.source_file, **kwargs)
+        self.items.extend(self.iter_items(**kwargs))
 
-        # Загружаем данные о полях
-        sheets_with_headers = self.get_headers_map(wb)
+        return self
+
+    @property
+    def budget_exceeded(self):
+        # Превышенный лимит, если разбор остановился досрочно с ParseBudget(partial=True)
+        return self.budget_tracker.exceeded if self.budget_tracker is not None else None
+
+    def start_budget(self, shared=None):
+        self.budget_tracker = self.budget.start(shared=shared) if self.budget is not None else None
+
+    def iter_budget_rows(self, ws, start_row=1, stop_row=None, columns=None):
+        # Все циклы по строкам идут через этот метод, чтобы лимиты ParseBudget проверялись прямо во время чтения
+        rows = self.iter_rows(ws=ws, start_row=start_row, stop_row=stop_row, columns=columns)
+
+        if self.budget_tracker is None:
+            return rows
+
+        return self.budget_tracker.limit(rows)
+
+    def load_sheets_concurrently(self, **kwargs):
+        # Листы независимы друг от друга, поэтому поиск заголовков и извлечение товаров на них можно делать
+        # параллельно. Результаты собираем в порядке листов, чтобы порядок товаров не зависел от числа воркеров
+        self.start_budget()
+
+        if self.sheet_executor == 'process':
+            sheet_names = self.get_source_worksheet_names(**kwargs)
+            sheets_results = self.load_sheets_in_processes(sheet_names, **kwargs)
+        elif self.sheet_executor == 'thread':
+            with self.stats.stage('load_file'):
+                wb = self.load_file(self.source_file, **kwargs)
 
-        if len(sheets_with_headers) == 0:
+            try:
+                sheet_names = self.get_worksheet_names(wb)
+                sheets_results = self.load_sheets_in_threads(wb, sheet_names)
+            finally:
+                self.close()
+        else:
+            raise ValueError(f'Unsupported sheet executor {self.sheet_executor}. Please use one of thread or process instead')
+
+        if len(sheets_results) == 0 and self.budget_exceeded is None:
             raise ValueError('No worksheets with detectable data found')
 
-        # Проходимся по всем листам с данными и загружаем из них товары
-        for sheet_info in sheets_with_headers:
-            self.items = self.items + self.extract_data_from_sheet(worksheet_info=sheet_info)
+        return [item for sheet_info, items in sheets_results for item in items]
 
-        return self
+    def load_sheets_in_threads(self, workbook, sheet_names):
+        # Книга уже открыта, поэтому раскладку с прошлого раза проверяем до раздачи листов
+        headers_map = self.apply_stored_layout(workbook, sheet_names)
+
+        with ThreadPoolExecutor(max_workers=self.sheet_workers) as executor:
+            if headers_map is not None:
+                return list(executor.map(lambda sheet_info: (sheet_info, list(self.iter_sheet_items(worksheet_info=sheet_info))), headers_map))
+
+            results = [result for result in executor.map(lambda sheet_name: self.extract_sheet_items(workbook, sheet_name), sheet_names) if result[0] is not None]
+
+        self.layout = self.build_layout(sheet_names, [sheet_info for sheet_info, items, layout_matched in results])
+
+        return [(sheet_info, items) for sheet_info, items, layout_matched in results]
+
+    def load_sheets_in_processes(self, sheet_names, **kwargs):
+        # Чтобы проверить раскладку здесь, пришлось бы открыть каждый лист (xlrd читает лист только целиком),
+        # поэтому листы и подписи заголовков сверяем здесь, а строку заголовков – в процессе, который разбирает лист.
+        # Если раскладка не подошла хотя бы на одном листе, ищем заголовки и на листах, которых в ней не было
+        sheet_layouts = self.get_sheet_layouts(sheet_names)
+
+        if sheet_layouts is None:
+            results = self.run_sheet_workers([(sheet_name, None) for sheet_name in sheet_names], **kwargs)
+            layout_applied = False
+        else:
+            results = self.run_sheet_workers(list(sheet_layouts.items()), **kwargs)
+            layout_applied = all(layout_matched for sheet_info, items, layout_matched in results.values())
+
+            if not layout_applied:
+                results.update(self.run_sheet_workers([(sheet_name, None) for sheet_name in sheet_names if sheet_name not in results], **kwargs))
+
+        results = [results[sheet_name] for sheet_name in sheet_names if sheet_name in results and results[sheet_name][0] is not None]
+
+        if not layout_applied:
+            self.layout = self.build_layout(sheet_names, [sheet_info for sheet_info, items, layout_matched in results])
+
+        return [(sheet_info, items) for sheet_info, items, layout_matched in results]
+
+    def run_sheet_workers(self, sheets, **kwargs):
+        # Каждый процесс один раз открывает файл и разбирает свою пачку листов. Листы раздаем по очереди,
+        # чтобы большие листы, которые обычно идут подряд, не достались одному процессу. Открытые файлы
+        # между процессами не передаются, поэтому такие источники отправляем содержимым
+        source_file = self.source_file if is_path(self.source_file) or isinstance(self.source_file, bytes) else read_bytes(self.source_file)
+        task_kwargs = self.get_worker_kwargs(kwargs)
+        # Счетчики ParseBudget процессы ведут общие, чтобы лимиты действовали на весь файл
+        shared_budget = self.budget_tracker.share() if self.budget_tracker is not None else None
+
+        batches = [sheets[idx::self.sheet_workers] for idx in range(self.sheet_workers)]
+        tasks = [(type(self), source_file, self.header_signatures, batch, task_kwargs) for batch in batches if len(batch) > 0]
+        sheets_results = {}
+
+        try:
+            with ProcessPoolExecutor(max_workers=self.sheet_workers, initializer=init_sheet_worker, initargs=(shared_budget,)) as executor:
+                for results, stats, exceeded in executor.map(extract_sheets_items, tasks):
+                    sheets_results.update(results)
+                    self.stats.merge(stats)
+
+                    if exceeded is not None and self.budget_tracker.exceeded is None:
+                        self.budget_tracker.exceeded = exceeded
+        finally:
+            if self.budget_tracker is not None:
+                self.budget_tracker.update_shared()
+
+        return sheets_results
+
+    def get_worker_kwargs(self, kwargs):
+        # Параметры для процессов, которые разбирают часть листов. Из kwargs load_data берем только то, как открыть
+        # файл, а настройки разбора – у самого экстрактора, их могли передать и в конструктор. Статистику каждый
+        # процесс собирает свою, потом добавляем ее к нашей
+        task_kwargs = {key: value for key, value in kwargs.items() if key not in self.worker_settings + ('stats', 'value_pool', 'intern_values', 'layout')}
+        task_kwargs.update({key: getattr(self, key) for key in self.worker_settings})
+
+        # Общий пул в другой процесс не передать, поэтому там у каждого процесса будет свой
+        if self.value_pool is not None:
+            task_kwargs['intern_values'] = True
+
+        return task_kwargs
+
+    def extract_sheet_items(self, workbook, sheet_name, sheet_layout=None):
+        # Заголовки листа, товары с него и подошла ли раскладка листа с прошлого раза. Если раскладка не подошла,
+        # ищем заголовки заново. (None, None, False), если заголовков на листе не нашлось
+        ws = self.get_worksheet(wb=workbook, ws_name=sheet_name)
+        header_row = None
+
+        if sheet_layout is not None:
+            with self.stats.stage('apply_layout', sheet_name=sheet_name):
+                header_row = self.check_sheet_layout(ws, sheet_layout)
+
+        if header_row is not None:
+            sheet_info = {'worksheet': ws, 'sheet_name': sheet_name, 'headers': header_row}
+        else:
+            sheet_info = self.get_sheet_headers(workbook, sheet_name)
+
+        if sheet_info is None:
+            return None, None, False
+
+        return sheet_info, list(self.iter_sheet_items(worksheet_info=sheet_info)), header_row is not None
+
+    def get_worker_options(self, kwargs):
+        # Параметры, с которыми файл открывает процесс, разбирающий только часть листов. По умолчанию те же,
+        # что и у вызывающего: от них зависит, можно ли читать лист в любом порядке и искать конец таблицы
+        return kwargs
+
+    def release_worksheet(self, wb, sheet_name):
+        # Освобождает разобранный лист, если формат позволяет выгружать листы по одному
+        pass
+
+    def get_source_worksheet_names(self, **kwargs):
+        wb = self.load_file(self.source_file, **kwargs)
+
+        try:
+            return self.get_worksheet_names(wb)
+        finally:
+            self.close()
+
+    def load_columns(self, **kwargs):
+        # Вместо списка товаров собираем по одному массиву на каждый тип столбца
+        columns = PricelistColumns()
+
+        for sheet_info in self.iter_sheets(**kwargs):
+            column_numbers, column_types = self.get_sheet_columns(worksheet_info=sheet_info)
+            rows = self.iter_table_rows(worksheet_info=sheet_info, columns=column_numbers)
+            rows_num = len(columns)
+
+            with self.stats.stage('extract', sheet_name=sheet_info.get('sheet_name')):
+                columns.append_rows(column_types, (row for row_idx, row in rows))
+
+            rows_num = len(columns) - rows_num
+            self.stats.add_counters({'rows_scanned': rows_num, 'cells_read': rows_num * len(column_numbers)}, sheet_name=sheet_info.get('sheet_name'))
+
+        return columns
+
+    def iter_items(self, **kwargs):
+        if self.sheet_workers is not None and self.sheet_workers > 1:
+            yield from self.load_sheets_concurrently(**kwargs)
+            return
+
+        # Проходимся по всем листам с данными и отдаем товары по мере чтения строк
+        for sheet_info in self.iter_sheets(**kwargs):
+            yield from self.iter_sheet_items(worksheet_info=sheet_info)
+
+    def iter_sheets(self, **kwargs):
+        self.start_budget()
+
+        with self.stats.stage('load_file'):
+            wb = self.load_file(self.source_file, **kwargs)
+
+        try:
+            # Загружаем данные о полях
+            sheets_with_headers = self.get_headers_map(wb)
+
+            if len(sheets_with_headers) == 0:
+                # Если заголовки не успели найти из-за лимита, отдаем пустой результат
+                if self.budget_exceeded is not None:
+                    return
+
+                raise ValueError('No worksheets with detectable data found')
+
+            yield from sheets_with_headers
+        finally:
+            self.close()
 
     def get_headers_map(self, workbook):
         sheet_names = self.get_worksheet_names(workbook)
+
+        # Поставщики редко меняют раскладку, поэтому сначала проверяем раскладку с прошлого раза
+        headers_map = self.apply_stored_layout(workbook, sheet_names)
+
+        if headers_map is not None:
+            return headers_map
+
         headers_map = []
 
         # Проверяем, на каких листах есть что-то похожее на данные о ценах
         # Для этого выбираем все листы, в которых мы можем распознать заголовки
         for sheet_name in sheet_names:
-            ws = self.get_worksheet(wb=workbook, ws_name=sheet_name)
-            headers = self.detect_headers(ws)
-
-            if len(headers) > 0:
-                headers = self.select_best_headers(headers)
-                headers_map.append({
-                    'worksheet': ws,
-                    'headers': headers,
-                })
+            sheet_info = self.get_sheet_headers(workbook, sheet_name)
+
+            if sheet_info is not None:
+                headers_map.append(sheet_info)
+
+        self.layout = self.build_layout(sheet_names, headers_map)
+
+        return headers_map
+
+    def build_layout(self, sheet_names, headers_map):
+        return {
+            'signatures': signatures_fingerprint(self.header_signatures),
+            'sheet_names': list(sheet_names),
+            'sheets': [{
+                'sheet_name': sheet_info['sheet_name'],
+                'row': sheet_info['headers']['row'],
+                'fingerprint': header_fingerprint(sheet_info['headers']['headers']),
+                'columns': [[header['column'], header['type']] for header in sheet_info['headers']['headers']],
+            } for sheet_info in headers_map],
+        }
+
+    def apply_stored_layout(self, workbook, sheet_names):
+        if self.layout is None:
+            return None
+
+        with self.stats.stage('apply_layout'):
+            return self.apply_layout(workbook, sheet_names, self.layout)
+
+    def get_sheet_layouts(self, sheet_names, layout=None):
+        # Раскладки листов по названиям, если листы и подписи заголовков те же, что в раскладке, иначе None
+        layout = layout if layout is not None else self.layout
+
+        if layout is None or len(layout['sheets']) == 0:
+            return None
+
+        if layout['signatures'] != signatures_fingerprint(self.header_signatures) or layout['sheet_names'] != list(sheet_names):
+            return None
+
+        return {sheet_layout['sheet_name']: sheet_layout for sheet_layout in layout['sheets']}
+
+    def check_sheet_layout(self, ws, sheet_layout):
+        # Строка заголовков, если в запомненной строке листа те же заголовки, иначе None
+        header_row = self.build_header_row(sheet_layout['row'], self.get_row(ws, row=sheet_layout['row']))
+        columns = [[header['column'], header['type']] for header in header_row['headers']]
+
+        if header_fingerprint(header_row['headers']) != sheet_layout['fingerprint'] or columns != sheet_layout['columns']:
+            return None
+
+        return header_row
+
+    def apply_layout(self, workbook, sheet_names, layout):
+        # Раскладка подходит, если листы и подписи заголовков те же, а в запомненных строках те же заголовки.
+        # Тогда читаем по одной строке на лист вместо поиска заголовков. Иначе возвращаем None
+        sheet_layouts = self.get_sheet_layouts(sheet_names, layout=layout)
+
+        if sheet_layouts is None:
+            return None
+
+        headers_map = []
+        for sheet_layout in sheet_layouts.values():
+            ws = self.get_worksheet(wb=workbook, ws_name=sheet_layout['sheet_name'])
+            header_row = self.check_sheet_layout(ws, sheet_layout)
+
+            if header_row is None:
+                return None
+
+            headers_map.append({
+                'worksheet': ws,
+                'sheet_name': sheet_layout['sheet_name'],
+                'headers': header_row,
+            })
 
         return headers_map
 
+    def get_sheet_headers(self, workbook, sheet_name):
+        ws = self.get_worksheet(wb=workbook, ws_name=sheet_name)
+
+        with self.stats.stage('detect_headers', sheet_name=sheet_name):
+            headers = self.detect_headers(ws, sheet_name=sheet_name)
+
+        if len(headers) == 0:
+            return None
+
+        with self.stats.stage('select_best_headers', sheet_name=sheet_name):
+            best_headers = self.select_best_headers(headers)
+
+        return {
+            'worksheet': ws,
+            'sheet_name': sheet_name,
+            'headers': best_headers,
+        }
+
     def extract_data_from_sheet(self, worksheet_info):
+        return list(self.iter_sheet_items(worksheet_info=worksheet_info))
+
+    def iter_sheet_items(self, worksheet_info):
         # Одна строка – один товар. Попутно валидируем данные, потому что поставщики любят вставлять пустые строки
         # для отбивки разных разделов
-        extracted = []
+        sheet_name = worksheet_info.get('sheet_name')
+
+        # Читаем из каждой строки только те столбцы, для которых нашлись заголовки
+        columns, column_types = self.get_sheet_columns(worksheet_info=worksheet_info)
+
+        # Счетчики копим в локальных переменных и записываем в статистику один раз, когда лист закончился.
+        # Время этапа – от начала до конца обхода листа, при потоковом чтении в него входит и обработка товаров
+        started = time.perf_counter()
+        rows_num = 0
+        items_num = 0
+        rejected = {}
+        rows = self.iter_table_rows(worksheet_info=worksheet_info, columns=columns)
+        value_pool = self.value_pool
+        sample_prices = 'price' in column_types
+        price_samples = 0
+        price_seconds = 0.0
+
+        if value_pool is not None:
+            pool_hits, pool_misses = value_pool.hits, value_pool.misses
+            rows = self.intern_rows(rows, column_types)
+
+        try:
+            for row_idx, row in rows:
+                rows_num += 1
+
+                if sample_prices and (rows_num - 1) % self.price_sample_every == 0:
+                    # На выборке строк цену товару задаем отдельно, чтобы замерить ее разбор
+                    values = dict(zip(column_types, row))
+                    price = values.pop('price')
+                    pricelist_item = PricelistParserItem(**values)
+
+                    price_started = time.perf_counter()
+                    pricelist_item.price = parse_price(price)
+                    price_seconds += time.perf_counter() - price_started
+                    price_samples += 1
+                else:
+                    pricelist_item = PricelistParserItem(**dict(zip(column_types, row)))
+
+                error = pricelist_item.validation_error()
+
+                if error is None:
+                    items_num += 1
+                    yield pricelist_item
+                else:
+                    rejected[error] = rejected.get(error, 0) + 1
+        finally:
+            self.stats.add_counters({
+                'rows_scanned': rows_num,
+                'cells_read': rows_num * len(columns),
+                'items': items_num,
+                'rows_rejected': rows_num - items_num,
+            }, rejected=rejected, sheet_name=sheet_name)
+
+            if value_pool is not None:
+                self.stats.add_counters({
+                    'pool_hits': value_pool.hits - pool_hits,
+                    'pool_misses': value_pool.misses - pool_misses,
+                }, sheet_name=sheet_name)
+
+            if price_samples > 0:
+                # Оценка, а не точное время: входит в extract и не вычитается из него
+                self.stats.add_counters({'price_parse_samples': price_samples}, sheet_name=sheet_name)
+                self.stats.add_timing('price_parse', price_seconds * rows_num / price_samples, sheet_name=sheet_name)
+
+            self.stats.add_timing('extract', time.perf_counter() - started, sheet_name=sheet_name)
+
+    def iter_table_rows(self, worksheet_info, columns):
+        # Строки таблицы под заголовком. Размер листа часто завышен из-за оформленных пустых ячеек, поэтому читаем
+        # только до последней строки с данными в нужных столбцах и останавливаемся после max_empty_rows пустых строк
+        # подряд. Одиночные пустые строки между разделами таблицу не прерывают
         ws = worksheet_info['worksheet']
-        for row_idx in range(worksheet_info['headers']['row'] + 1, self.get_rows_num(ws) + 1):
-            extruded = {}
+        stop_row = self.get_used_rows_num(ws, columns=columns, sheet_name=worksheet_info.get('sheet_name'))
+        rows = self.iter_budget_rows(ws=ws, start_row=worksheet_info['headers']['row'] + 1, stop_row=stop_row, columns=columns)
+
+        if not self.max_empty_rows:
+            return rows
+
+        return self.stop_at_empty_rows(rows)
+
+    def stop_at_empty_rows(self, rows):
+        empty_rows = 0
+
+        for row_idx, row in rows:
+            if is_empty_row(row):
+                empty_rows += 1
 
-            for header_info in worksheet_info['headers']['headers']:
-                col_idx = header_info['column']
-                column_type = header_info['type']
+                if empty_rows >= self.max_empty_rows:
+                    return
 
-                extruded[str(column_type)] = self.get_cell(ws=ws, col=col_idx, row=row_idx)
+                continue
 
-            pricelist_item = PricelistParserItem(**extruded)
+            empty_rows = 0
 
-            if pricelist_item.is_valid():
-                extracted.append(pricelist_item)
+            yield row_idx, row
 
-        return extracted
+    def get_used_rows_num(self, ws, columns=None, sheet_name=None):
+        # Номер последней строки, в которой есть данные в столбцах columns. Идем с конца листа, пока строки пустые.
+        # Листы, которые читаются только потоком, пришлось бы прочитать целиком, для них None – читать до конца
+        if not self.random_access:
+            return None
+
+        rows_num = self.get_rows_num(ws)
+
+        if rows_num is None:
+            return None
+
+        last_row = self.find_last_row(ws, rows_num, columns=columns)
+
+        if last_row < rows_num:
+            self.stats.add_counters({'rows_trimmed': rows_num - last_row}, sheet_name=sheet_name)
+
+        return last_row
+
+    def get_used_columns(self, ws):
+        # Столбцы до последнего, в котором есть данные, или None – все столбцы листа
+        return None
 
-    def detect_headers(self, worksheet):
+    def find_last_row(self, ws, rows_num, columns=None):
+        # Прочитанные с конца строки тоже считаются в лимитах ParseBudget
+        rows = ((row_idx, self.get_row(ws, row_idx, columns=columns)) for row_idx in range(rows_num, 0, -1))
+
+        if self.budget_tracker is not None:
+            rows = self.budget_tracker.limit(rows)
+
+        for row_idx, row in rows:
+            if not is_empty_row(row):
+                return row_idx
+
+        return 0
+
+    def intern_rows(self, rows, column_types):
+        # Артикулы почти все разные, а цены превращаются в числа, поэтому их через пул не пропускаем
+        pooled = [idx for idx, column_type in enumerate(column_types) if column_type not in ('sku', 'price')]
+        intern = self.value_pool.intern
+
+        for row_idx, row in rows:
+            row = list(row)
+
+            for idx in pooled:
+                row[idx] = intern(row[idx])
+
+            yield row_idx, row
+
+    @staticmethod
+    def get_sheet_columns(worksheet_info):
+        headers = worksheet_info['headers']['headers']
+
+        return [header_info['column'] for header_info in headers], [str(header_info['type']) for header_info in headers]
+
+    def detect_headers(self, worksheet, sheet_name=None):
+        if not self.header_probe_rows:
+            return self.scan_headers(worksheet, start_row=1, sheet_name=sheet_name)
+
+        # Заголовки почти всегда находятся в начале листа, поэтому сначала смотрим только первые строки
+        # и останавливаемся на первой строке, в которой нашлись все обязательные столбцы
+        detected_header_rows = self.scan_headers(worksheet, start_row=1, stop_row=self.header_probe_rows, stop_when_complete=True, sheet_name=sheet_name)
+
+        for header_row in detected_header_rows:
+            if self.is_complete_headers(header_row):
+                return detected_header_rows
+
+        # Раскладка нестандартная – досматриваем оставшуюся часть листа целиком
+        return detected_header_rows + self.scan_headers(worksheet, start_row=self.header_probe_rows + 1, sheet_name=sheet_name)
+
+    def scan_headers(self, worksheet, start_row=1, stop_row=None, stop_when_complete=False, sheet_name=None):
         detected_header_rows = []
+        rows_num = 0
+        cells_num = 0
 
-        # Для поиска проходимся по всем строкам таблицы. Строк с заголовками может найтись не одна, потом отсеем лишние
-        for row_idx in range(1, self.get_rows_num(ws=worksheet) + 1):
-            for col_idx in range(1, self.get_cols_num(worksheet) + 1):
-                header_type = self.detect_header_type(str(self.get_cell(ws=worksheet, row=row_idx, col=col_idx)))
+        # Строк с заголовками может найтись не одна, потом отсеем лишние
+        for row_idx, row in self.iter_budget_rows(ws=worksheet, start_row=start_row, stop_row=stop_row, columns=self.get_used_columns(worksheet)):
+            rows_num += 1
+            cells_num += len(row)
+
+            for cell_value in row:
+                header_type = self.detect_header_type(cell_value)
 
                 # Если хотя бы одна ячейка в строке определилась как заголовок
                 if header_type is not None:
-                    # Записываем все непустые значения в качестве заголовков, попутно определяя ее тип,
-                    # переходим к следующей строке
-                    headers = []
-
-                    for _col_idx in range(1, self.get_cols_num(worksheet) + 1):
-                        cell_value = self.get_cell(worksheet, col=_col_idx, row=row_idx)
+                    # Записываем строку целиком и переходим к следующей
+                    detected_header_rows.append(self.build_header_row(row_idx, row))
 
-                        if cell_value and str(cell_value).strip() != '':
-                            headers.append({
-                                'column': _col_idx,
-                                'name': cell_value,
-                                'type': self.detect_header_type(cell_value),
-                            })
+                    break
 
-                    detected_header_rows.append({
-                        'row': row_idx,
-                        'headers': headers,
-                    })
+            if stop_when_complete and len(detected_header_rows) > 0 and self.is_complete_headers(detected_header_rows[-1]):
+                break
 
-                    break
+        self.stats.add_counters({'rows_scanned': rows_num, 'cells_read': cells_num}, sheet_name=sheet_name)
 
         return detected_header_rows
 
+    def build_header_row(self, row_idx, row):
+        # Записываем все непустые значения в качестве заголовков, попутно определяя их тип
+        headers = []
+
+        for col_idx, cell_value in enumerate(row, start=1):
+            if cell_value and str(cell_value).strip() != '':
+                headers.append({
+                    'column': col_idx,
+                    'name': cell_value,
+                    'type': self.detect_header_type(cell_value),
+                })
+
+        return {
+            'row': row_idx,
+            'headers': headers,
+        }
+
+    def score_headers(self, header_row):
+        # Сначала важно, сколько обязательных типов покрывает строка, затем – сколько столбцов удалось распознать
+        detected_types = set()
+        detected = 0
+
+        for header in header_row['headers']:
+            if header['type'] is not None:
+                detected_types.add(header['type'])
+                detected += 1
+
+        return len(detected_types.intersection(self.required_headers)), detected
+
+    def is_complete_headers(self, header_row):
+        return self.score_headers(header_row)[0] == len(set(self.required_headers))
+
     def select_best_headers(self, headers):
         # Если строка с заголовком только одна, то и вернем её
         if len(headers) == 1:
             return headers[0]
 
-        # Вычислим количество найденных столбцов, тип которых мы смогли определить
+        # Оценим каждую строку по количеству найденных обязательных и остальных столбцов
         detected_headers = {}
         for variant in headers:
-            detected = 0
-            for header in variant['headers']:
-                if header['type'] is not None:
-                    detected += 1
+            detected_headers[variant['row']] = self.score_headers(variant)
 
-            detected_headers[variant['row']] = detected
-
-        # Отсортируем по количеству столбцов, чтобы найти строку с максимальным количеством заголовком
+        # Отсортируем по оценке, чтобы найти строку с максимальным количеством заголовков
         detected_headers = {k: v for k, v in sorted(detected_headers.items(), key=lambda item: item[1])}
         row = detected_headers.popitem()[0]
 
@@ -148,12 +727,36 @@ class Extruder(object):
                 return variant
 
     def detect_header_type(self, cell_value):
-        for header_type, headers in self.header_signatures.items():
-            for substring in headers:
-                if substring in str(cell_value).lower().strip():
-                    return header_type
+        if self._header_matcher is None:
+            self._header_matcher, self._header_types = compile_header_signatures(self.header_signatures)
 
-        return None
+        match = self._header_matcher.match(normalize_cell_value(cell_value))
+
+        if match is None:
+            return None
+
+        return self._header_types[int(match.lastgroup[1:])]
+
+    def get_row(self, ws, row, columns=None):
+        # Значения ячеек одной строки. Если передан columns, то только этих столбцов и в том же порядке
+        if columns is None:
+            columns = range(1, self.get_cols_num(ws) + 1)
+
+        return [self.get_cell(ws=ws, col=col_idx, row=row) for col_idx in columns]
+
+    def iter_rows(self, ws, start_row=1, stop_row=None, columns=None):
+        # Построчный обход листа. Отдает пары (номер строки, значения ячеек), нумерация строк начинается с единицы.
+        # Бэкенды переопределяют этот метод, чтобы читать строки целиком, а не по одной ячейке
+        rows_num = self.get_rows_num(ws)
+
+        if stop_row is None or stop_row > rows_num:
+            stop_row = rows_num
+
+        for row_idx in range(start_row, stop_row + 1):
+            yield row_idx, self.get_row(ws, row=row_idx, columns=columns)
+
+    def close(self):
+        pass
 
     @abstractmethod
     def load_file(self, filename, **kwargs):
@@ -180,11 +783,174 @@ class Extruder(object):
         pass
 
 
+# Общие счетчики ParseBudget в процессе, который разбирает часть листов файла
+_shared_budget = None
+
+
+def init_sheet_worker(shared_budget):
+    # Общую память можно передать в процесс только при его запуске, а не вместе с задачей
+    global _shared_budget
+    _shared_budget = shared_budget
+
+
+def extract_sheets_items(task):
+    # Разбор пачки листов в отдельном процессе. Файл открывается один раз, а если формат позволяет – так,
+    # чтобы листы читались только при обращении к ним, и разобранный лист сразу освобождается
+    extruder_class, source_file, signatures, sheets, kwargs = task
+
+    extruder = extruder_class(source_file, **kwargs)
+    extruder.update_header_signatures(signatures, replace=True)
+    extruder.start_budget(shared=_shared_budget)
+
+    with extruder.stats.stage('load_file'):
+        wb = extruder.load_file(source_file, **extruder.get_worker_options(kwargs))
+
+    try:
+        results = {}
+
+        # sheets – пары (название листа, его раскладка с прошлого раза или None)
+        for sheet_name, sheet_layout in sheets:
+            sheet_info, items, layout_matched = extruder.extract_sheet_items(wb, sheet_name, sheet_layout=sheet_layout)
+            extruder.release_worksheet(wb, sheet_name)
+
+            # Открытый лист в другой процесс не передать, возвращаем только заголовки
+            if sheet_info is not None:
+                sheet_info = {'sheet_name': sheet_name, 'headers': sheet_info['headers']}
+
+            results[sheet_name] = (sheet_info, items, layout_matched)
+
+        return results, extruder.stats, extruder.budget_exceeded
+    finally:
+        extruder.close()
+
+
 class XlsxExtruder(Extruder):
+    sheet_executor = 'process'
+    engines = ('openpyxl', 'xml')
+
+    @property
+    def random_access(self):
+        # Книгу в режиме read_only и движком xml можно читать только потоком
+        return self.loaded_file is not None and not self.loaded_file.read_only
+
+    def __init__(self, source_file=None, **kwargs):
+        self.binary_file = None
+        super().__init__(source_file, **kwargs)
+
     def load_file(self, filename, **kwargs):
-        self.loaded_file = load_workbook(filename=filename)
+        # В режиме read_only openpyxl не строит в памяти все ячейки, а читает лист потоком по мере обхода строк.
+        # use_mmap – отображать файл в память вместо обычного чтения.
+        # engine='xml' – читать листы прямо из архива без openpyxl: только значения, без стилей и объектов ячеек
+        read_only = kwargs['read_only'] if 'read_only' in kwargs else False
+        use_mmap = kwargs['use_mmap'] if 'use_mmap' in kwargs else False
+        engine = kwargs['engine'] if 'engine' in kwargs else 'openpyxl'
+
+        if engine not in self.engines:
+            raise ValueError(f'Unsupported xlsx engine {engine}. Please use one of openpyxl or xml instead')
+
+        if engine == 'xml':
+            self.loaded_file = XlsxReader(self.open_source(filename, use_mmap=use_mmap))
+
+            return self.loaded_file
+
+        self.loaded_file = load_workbook(filename=self.open_source(filename, use_mmap=use_mmap), read_only=read_only)
+
+        if not read_only:
+            # Книга уже целиком в памяти, файл больше не нужен
+            self.close_source()
+
         return self.loaded_file
 
+    def open_source(self, filename, use_mmap=False):
+        # openpyxl проверяет расширение у путей, поэтому даже файлы с диска передаем ему открытыми
+        self.close_source()
+
+        binary_file, owned = open_binary(filename, use_mmap=use_mmap)
+
+        if owned:
+            self.binary_file = binary_file
+
+        return binary_file
+
+    def close_source(self):
+        if self.binary_file is not None:
+            self.binary_file.close()
+            self.binary_file = None
+
+    def get_row(self, ws, row, columns=None):
+        for row_idx, values in self.iter_rows(ws, start_row=row, stop_row=row, columns=columns):
+            return values
+
+        return pick_columns([], columns)
+
+    def iter_rows(self, ws, start_row=1, stop_row=None, columns=None):
+        # За пределами листа openpyxl создает пустые ячейки, поэтому не выходим за max_row.
+        # В режиме read_only размер листа может быть неизвестен, тогда читаем до конца
+        if ws.max_row is not None and (stop_row is None or stop_row > ws.max_row):
+            stop_row = ws.max_row
+
+        if stop_row is not None and stop_row < start_row:
+            return
+
+        # Просим у openpyxl только диапазон нужных столбцов, чтобы не создавать лишние значения
+        min_col = min(columns) if columns else None
+        max_col = max(columns) if columns else None
+
+        rows = ws.iter_rows(min_row=start_row, max_row=stop_row, min_col=min_col, max_col=max_col, values_only=True)
+
+        if columns is not None:
+            shifted_columns = [col_idx - min_col + 1 for col_idx in columns] if columns else []
+
+            for row_idx, row in enumerate(rows, start=start_row):
+                yield row_idx, pick_columns(row, shifted_columns)
+        else:
+            for row_idx, row in enumerate(rows, start=start_row):
+                yield row_idx, row
+
+    def find_last_row(self, ws, rows_num, columns=None):
+        # Загруженный лист openpyxl хранит только ячейки, которые есть в файле, поэтому последнюю строку
+        # с данными ищем среди них, не создавая пустые ячейки до max_row
+        columns = set(columns) if columns is not None else None
+        last_row = 0
+
+        for (row_idx, col_idx), cell in ws._cells.items():
+            if row_idx > last_row and (columns is None or col_idx in columns) and not is_empty_row((cell.value,)):
+                last_row = row_idx
+
+        return min(last_row, rows_num)
+
+    def get_used_columns(self, ws):
+        # Как и max_row, max_column раздувается оформлением пустых ячеек. При поиске заголовков читаем строки
+        # только до последнего столбца с данными
+        if not self.random_access or ws.max_column is None:
+            return None
+
+        last_col = max((col_idx for (row_idx, col_idx), cell in ws._cells.items() if not is_empty_row((cell.value,))), default=0)
+
+        if last_col >= ws.max_column:
+            return None
+
+        return list(range(1, last_col + 1))
+
+    def get_source_worksheet_names(self, **kwargs):
+        # Для списка листов не нужно загружать ячейки
+        if 'engine' in kwargs and kwargs['engine'] == 'xml':
+            wb = XlsxReader(self.open_source(self.source_file))
+        else:
+            wb = load_workbook(filename=self.open_source(self.source_file), read_only=True)
+
+        try:
+            return wb.sheetnames
+        finally:
+            wb.close()
+            self.close_source()
+
+    def close(self):
+        if self.loaded_file is not None and self.loaded_file.read_only:
+            self.loaded_file.close()
+
+        self.close_source()
+
     def get_worksheet_names(self, wb):
         return wb.sheetnames
 
@@ -202,10 +968,41 @@ class XlsxExtruder(Extruder):
 
 
 class XlsExtruder(Extruder):
+    sheet_executor = 'process'
+
     def load_file(self, filename, **kwargs):
-        self.loaded_file = xlrd.open_workbook(filename)
+        # on_demand – загружать листы только при обращении к ним
+        on_demand = kwargs['on_demand'] if 'on_demand' in kwargs else False
+
+        self.loaded_file = self.open_workbook(filename, on_demand=on_demand)
         return self.loaded_file
 
+    @staticmethod
+    def open_workbook(filename, on_demand=False):
+        # Файл на диске xlrd сам отображает в память. Остальные источники передаем содержимым: переданный
+        # mmap xlrd закрыл бы после чтения, поэтому его тоже копируем
+        if is_path(filename):
+            return xlrd.open_workbook(filename, on_demand=on_demand)
+
+        return xlrd.open_workbook(file_contents=read_bytes(filename), on_demand=on_demand)
+
+    def get_worker_options(self, kwargs):
+        # Процесс с частью листов разбирает только их, а не всю книгу
+        return {**kwargs, 'on_demand': True}
+
+    def release_worksheet(self, wb, sheet_name):
+        if wb.on_demand:
+            wb.unload_sheet(sheet_name)
+
+    def get_source_worksheet_names(self, **kwargs):
+        # Для списка листов не нужно разбирать сами листы
+        wb = self.open_workbook(self.source_file, on_demand=True)
+
+        try:
+            return self.get_worksheet_names(wb)
+        finally:
+            wb.release_resources()
+
     def get_worksheet_names(self, wb):
         return wb.sheet_names()
 
@@ -221,22 +1018,139 @@ class XlsExtruder(Extruder):
     def get_cell(self, ws, col, row):
         return ws.cell(row - 1, col - 1).value
 
+    def get_row(self, ws, row, columns=None):
+        if row > ws.nrows:
+            return pick_columns([], columns)
+
+        return pick_columns(ws.row_values(row - 1), columns)
+
+    def iter_rows(self, ws, start_row=1, stop_row=None, columns=None):
+        if stop_row is None or stop_row > ws.nrows:
+            stop_row = ws.nrows
+
+        for row_idx in range(start_row, stop_row + 1):
+            yield row_idx, pick_columns(ws.row_values(row_idx - 1), columns)
+
 
 class CsvExtruder(Extruder):
+    # Сколько первых строк файла держать в памяти. Их хватает для поиска заголовков, остальные строки читаются потоком
+    head_rows = 100
+    # Сколько первых байтов файла смотреть, чтобы определить кодировку и формат при encoding='auto' и delimiter='auto'
+    sniff_size = 64 * 1024
+    sniff_delimiters = ',;\t|'
+    encoding_candidates = ('cp1251', 'koi8_r', 'cp866')
+
+    @property
+    def random_access(self):
+        # Большой файл, от которого в памяти только начало, читается потоком
+        return self.is_fully_loaded
+
     def __init__(self, source_file=None, **kwargs):
         self.data = []
+        self.filename = None
+        self.encoding = 'utf-8'
+        self.dialect = get_dialect_params(csv.excel)
+        self.use_mmap = False
+        self.is_fully_loaded = False
+        self._rows_num = None
         super().__init__(source_file, **kwargs)
 
     def load_file(self, filename, **kwargs):
-        encoding = kwargs['encoding'] if 'encoding' in kwargs else 'utf-8'
+        self.encoding = kwargs['encoding'] if 'encoding' in kwargs else 'utf-8'
+        self.use_mmap = kwargs['use_mmap'] if 'use_mmap' in kwargs else False
+        self.filename = filename
+        self._rows_num = None
+
+        delimiter = kwargs['delimiter'] if 'delimiter' in kwargs else None
+        self.dialect = get_dialect_params(csv.excel)
+
+        # Кодировку и формат определяем один раз по началу файла, сам файл потом читается за один проход
+        if self.encoding == 'auto' or delimiter == 'auto':
+            sample = read_head(filename, self.sniff_size)
+
+            if self.encoding == 'auto':
+                self.encoding = detect_encoding(sample, candidates=self.encoding_candidates) if isinstance(sample, bytes) else 'utf-8'
 
-        with open(filename, 'r', encoding=encoding) as file_object:
-            reader = csv.reader(file_object)
-            for row in reader:
-                self.data.append(row)
+            if delimiter == 'auto':
+                self.dialect = self.sniff_dialect(sample)
+        elif delimiter is not None:
+            self.dialect['delimiter'] = delimiter
+
+        with self.open_file() as file_object:
+            reader = csv.reader(file_object, **self.dialect)
+            self.data = list(islice(reader, self.head_rows))
+            self.is_fully_loaded = next(reader, None) is None
 
         return self
 
+    def sniff_dialect(self, sample):
+        if isinstance(sample, bytes):
+            sample = codecs.getincrementaldecoder(self.encoding)(errors='replace').decode(sample)
+
+        # Последняя строка образца может быть обрезана, отбрасываем ее
+        if len(sample) >= self.sniff_size:
+            sample = sample[:sample.rfind('\n') + 1] or sample
+
+        dialect = get_dialect_params(csv.excel)
+        dialect['delimiter'] = self.sniff_delimiter(sample)
+
+        # Символ кавычек определяет csv.Sniffer, но только для уже выбранного разделителя. Остальное оставляем как
+        # в csv.excel: если в образце нет "", csv.Sniffer выключает doublequote, и кавычки внутри значений дальше
+        # в файле портили бы данные
+        try:
+            dialect['quotechar'] = csv.Sniffer().sniff(sample, delimiters=dialect['delimiter']).quotechar
+        except csv.Error:
+            pass
+
+        return dialect
+
+    def sniff_delimiter(self, sample):
+        # В прайслистах строки разной длины (разделы, итоги), поэтому csv.Sniffer часто ошибается. Выбираем
+        # разделитель, при котором больше всего строк делятся на одинаковое число столбцов (больше одного)
+        lines = sample.splitlines()
+        best_delimiter, best_score = ',', (0, 0)
+
+        for delimiter in self.sniff_delimiters:
+            counts = {}
+
+            for row in csv.reader(lines, delimiter=delimiter):
+                if len(row) > 1:
+                    counts[len(row)] = counts.get(len(row), 0) + 1
+
+            if len(counts) == 0:
+                continue
+
+            columns_num, rows_num = max(counts.items(), key=lambda item: (item[1], item[0]))
+            score = (rows_num, columns_num)
+
+            if score > best_score:
+                best_delimiter, best_score = delimiter, score
+
+        return best_delimiter
+
+    def open_file(self):
+        return open_text(self.filename, encoding=self.encoding, use_mmap=self.use_mmap)
+
+    def get_row(self, ws, row, columns=None):
+        for row_idx, values in ws.iter_rows(ws, start_row=row, stop_row=row, columns=columns):
+            return values
+
+        return pick_columns([], columns)
+
+    def iter_rows(self, ws, start_row=1, stop_row=None, columns=None):
+        # Если нужные строки уже лежат в памяти, отдаем их оттуда, иначе перечитываем файл потоком
+        if ws.is_fully_loaded or (stop_row is not None and stop_row <= len(ws.data)):
+            for row_idx, row in enumerate(ws.data[start_row - 1:stop_row], start=start_row):
+                yield row_idx, pick_columns(row, columns)
+
+            return
+
+        with ws.open_file() as file_object:
+            rows = islice(csv.reader(file_object, **ws.dialect), start_row - 1, stop_row)
+
+            for row_idx, row in enumerate(rows, start=start_row):
+                yield row_idx, pick_columns(row, columns)
+
     def get_worksheet_names(self, wb):
         return ['default']
 
@@ -244,10 +1158,18 @@ class CsvExtruder(Extruder):
         return self
 
     def get_cols_num(self, ws):
-        return len(ws.data[0])
+        # Строки в CSV бывают разной длины, поэтому берем самую длинную из загруженных
+        return max((len(row) for row in ws.data), default=0)
 
     def get_rows_num(self, ws):
-        return len(ws.data)
+        if ws.is_fully_loaded:
+            return len(ws.data)
+
+        if ws._rows_num is None:
+            ws._rows_num = sum(1 for _ in ws.iter_rows(ws))
+
+        return ws._rows_num
 
     def get_cell(self, ws, col, row):
-        return ws.data[row - 1][col - 1]
+        # Короткие строки дополняются пустыми значениями
+        return ws.get_row(ws, row=row, columns=[col])[0]
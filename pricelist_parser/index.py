@@ -0,0 +1,81 @@
+import re
+
+_whitespace = re.compile(r'\s+')
+
+
+class SkuIndex(object):
+    # Индекс товаров по артикулу для всех источников парсера. По артикулу отдает словарь slug → товар.
+    # Если артикул повторяется внутри одного источника, остается товар по правилу duplicates:
+    # first – первый, last – последний, min_price – самый дешевый, all – все товары списком
+    duplicate_policies = ('first', 'last', 'min_price', 'all')
+
+    def __init__(self, duplicates='first', ignore_case=False, ignore_whitespace=False, ignore_leading_zeros=False):
+        if duplicates not in self.duplicate_policies:
+            raise ValueError(f'Unsupported duplicates policy {duplicates}. Please use one of first, last, min_price or all instead')
+
+        self.duplicates = duplicates
+        self.ignore_case = ignore_case
+        self.ignore_whitespace = ignore_whitespace
+        self.ignore_leading_zeros = ignore_leading_zeros
+        self._index = {}
+        self._source_keys = {}
+
+    def normalize(self, sku):
+        if self.ignore_whitespace:
+            sku = _whitespace.sub('', sku)
+
+        if self.ignore_case:
+            sku = sku.casefold()
+
+        if self.ignore_leading_zeros:
+            # Артикул из одних нулей не превращаем в пустую строку
+            sku = sku.lstrip('0') or sku[-1:]
+
+        return sku
+
+    def add(self, slug, items):
+        # Повторная загрузка источника заменяет его товары в индексе
+        self.remove(slug)
+
+        keys = set()
+        for item in items:
+            key = self.normalize(item.sku)
+            entries = self._index.setdefault(key, {})
+            keys.add(key)
+
+            if slug not in entries:
+                entries[slug] = [item] if self.duplicates == 'all' else item
+            elif self.duplicates == 'all':
+                entries[slug].append(item)
+            elif self.duplicates == 'last':
+                entries[slug] = item
+            elif self.duplicates == 'min_price' and item.price < entries[slug].price:
+                entries[slug] = item
+
+        self._source_keys[slug] = keys
+
+    def remove(self, slug):
+        for key in self._source_keys.pop(slug, ()):
+            entries = self._index[key]
+            entries.pop(slug, None)
+
+            if len(entries) == 0:
+                del self._index[key]
+
+    def get(self, sku, default=None):
+        return self._index.get(self.normalize(sku), default)
+
+    def __getitem__(self, sku):
+        return self._index[self.normalize(sku)]
+
+    def __contains__(self, sku):
+        return self.normalize(sku) in self._index
+
+    def __len__(self):
+        return len(self._index)
+
+    def keys(self):
+        return self._index.keys()
+
+    def items(self):
+        return self._index.items()
@@ -0,0 +1,59 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+
+
+def header_fingerprint(headers):
+    # Отпечаток строки заголовков: номера непустых столбцов и их нормализованные названия
+    values = [[header['column'], str(header['name']).lower().strip()] for header in headers]
+
+    return hashlib.sha1(json.dumps(values, ensure_ascii=False).encode('utf-8')).hexdigest()
+
+
+def signatures_fingerprint(signatures):
+    return hashlib.sha1(json.dumps(signatures, sort_keys=True, ensure_ascii=False).encode('utf-8')).hexdigest()
+
+
+class LayoutStore(object):
+    # Раскладки прайслистов по поставщикам: на каких листах и в какой строке были заголовки и какие столбцы
+    # каких типов. Если путь не указан, раскладки хранятся только в памяти
+    def __init__(self, path=None):
+        self.path = path
+        self.layouts = {}
+        self._lock = threading.Lock()
+
+        if path is not None and os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as file_object:
+                self.layouts = json.load(file_object)
+
+    def get(self, key):
+        return self.layouts.get(key)
+
+    def set(self, key, layout):
+        with self._lock:
+            self.layouts[key] = layout
+
+            if self.path is not None:
+                self.save()
+
+    def remove(self, key):
+        with self._lock:
+            self.layouts.pop(key, None)
+
+            if self.path is not None:
+                self.save()
+
+    def save(self):
+        directory = os.path.dirname(os.path.abspath(self.path))
+        file_descriptor, temporary_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+
+        try:
+            with os.fdopen(file_descriptor, 'w', encoding='utf-8') as file_object:
+                json.dump(self.layouts, file_object, ensure_ascii=False)
+
+            os.replace(temporary_path, self.path)
+        except BaseException:
+            os.remove(temporary_path)
+            raise
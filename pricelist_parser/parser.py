@@ -1,14 +1,193 @@
-from os.path import basename, splitext
+import asyncio
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial
+from os.path import basename, isfile, splitext
 
+from .aio import aiter_blocking
 from .extruders import CsvExtruder, XlsExtruder, XlsxExtruder
+from .sources import is_path, sniff_file_type
 
 
 class PricelistParser(object):
-    def __init__(self):
+    def __init__(self, cache=None, layouts=None, index=None, value_pool=None):
+        # cache – PricelistCache, в котором хранятся результаты разбора уже встречавшихся файлов,
+        # layouts – LayoutStore с раскладками файлов по slug, чтобы не искать заголовки заново,
+        # index – SkuIndex, который пополняется товарами каждого добавленного источника,
+        # value_pool – ValuePool, общий для строк всех источников
         self.data_sources = {}
+        self.errors = {}
+        self.cache = cache
+        self.layouts = layouts
+        self.index = index
+        self.value_pool = value_pool
 
     def add_data_source(self, source_file, slug=None, header_signatures=None, replace_header_signatures=False, **kwargs):
-        file_type = self.detect_file_type(path=source_file)
+        if slug is None:
+            slug = self.get_slug(source_file)
+
+        kwargs = self.get_pool_options(self.get_layout_options(slug, kwargs))
+        extruder = self.get_extruder(source_file, header_signatures=header_signatures, replace_header_signatures=replace_header_signatures, **kwargs)
+
+        cache_key = self.load_cached_items(extruder, source_file, **kwargs)
+
+        if extruder.from_cache is False:
+            extruder.load_data(**kwargs)
+            self.store_cached_items(extruder, cache_key)
+
+        self.register_data_source(slug, extruder)
+
+        return extruder
+
+    async def add_data_source_async(self, source_file, slug=None, header_signatures=None, replace_header_signatures=False, executor=None, chunk_size=100, **kwargs):
+        if slug is None:
+            slug = self.get_slug(source_file)
+
+        kwargs = self.get_layout_options(slug, kwargs)
+
+        if isinstance(executor, ProcessPoolExecutor):
+            options = {'source_file': source_file, 'slug': slug, 'header_signatures': header_signatures, 'replace_header_signatures': replace_header_signatures, **self.get_pool_options(kwargs, shared=False)}
+            extruder = await asyncio.get_running_loop().run_in_executor(executor, load_data_source, options, self.cache)
+        else:
+            kwargs = self.get_pool_options(kwargs)
+            # Чтобы определить формат, файл читается с диска, поэтому и это делаем в executor
+            extruder = await asyncio.get_running_loop().run_in_executor(executor, partial(self.get_extruder, source_file, header_signatures=header_signatures, replace_header_signatures=replace_header_signatures, **kwargs))
+            cache_key = await asyncio.get_running_loop().run_in_executor(executor, partial(self.load_cached_items, extruder, source_file, **kwargs))
+
+            if extruder.from_cache is False:
+                items = aiter_blocking(partial(extruder.iter_items, **kwargs), executor=executor, chunk_size=chunk_size)
+                extruder.items.extend([item async for item in items])
+                await asyncio.get_running_loop().run_in_executor(executor, self.store_cached_items, extruder, cache_key)
+
+        # Источник добавляется, только если разбор завершился и не был отменен
+        self.register_data_source(slug, extruder)
+
+        return extruder
+
+    def add_data_sources(self, sources, workers=None, **kwargs):
+        # Каждый источник – путь к файлу или словарь с параметрами add_data_source. Общие параметры из kwargs
+        # применяются ко всем источникам, параметры источника их перекрывают
+        tasks = []
+        for source in sources:
+            options = {**kwargs, **source} if isinstance(source, dict) else {**kwargs, 'source_file': source}
+
+            if options.get('slug') is None:
+                options['slug'] = self.get_slug(options['source_file'])
+
+            tasks.append(self.get_pool_options(self.get_layout_options(options['slug'], options), shared=False))
+
+        loaded = {}
+
+        if workers == 1:
+            results = [(options, self._run_task(load_data_source, options, self.cache)) for options in tasks]
+        else:
+            # Файлы разбираются параллельно в отдельных процессах
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                futures = [(options, executor.submit(load_data_source, options, self.cache)) for options in tasks]
+                results = [(options, self._run_task(future.result)) for options, future in futures]
+
+            # Если процесс упал, пул ломается и ошибку получают все файлы, которые еще не разобраны. Какой из них
+            # уронил процесс, не узнать, поэтому разбираем их заново, каждый в своем процессе
+            broken = [idx for idx, (options, (extruder, error)) in enumerate(results) if isinstance(error, BrokenProcessPool)]
+
+            if len(broken) > 0:
+                with ThreadPoolExecutor(max_workers=workers) as executor:
+                    retried = list(executor.map(self._run_isolated, [tasks[idx] for idx in broken]))
+
+                for idx, result in zip(broken, retried):
+                    results[idx] = (tasks[idx], result)
+
+        # Ошибка в одном файле не прерывает разбор остальных, она сохраняется в errors под slug источника
+        for options, (extruder, error) in results:
+            slug = options['slug']
+
+            if error is not None:
+                self.errors[slug] = error
+                continue
+
+            self.register_data_source(slug, extruder)
+            loaded[slug] = extruder
+
+        return loaded
+
+    def register_data_source(self, slug, extruder):
+        self.store_layout(slug, extruder)
+        self.data_sources[slug] = extruder
+        self.errors.pop(slug, None)
+
+        if self.index is not None:
+            self.index.add(slug, extruder.items)
+
+    def get_layout_options(self, slug, options):
+        # Раскладку передаем параметром, чтобы она дошла и до разбора в других процессах
+        if self.layouts is None or 'layout' in options:
+            return options
+
+        return {**options, 'layout': self.layouts.get(slug)}
+
+    def get_pool_options(self, options, shared=True):
+        # В другой процесс общий пул не передать, там у каждого файла будет свой
+        if self.value_pool is None or 'value_pool' in options or 'intern_values' in options:
+            return options
+
+        if shared:
+            return {**options, 'value_pool': self.value_pool}
+
+        return {**options, 'intern_values': True}
+
+    def store_layout(self, slug, extruder):
+        # Разбор, остановленный по лимиту, мог не дойти до всех листов, поэтому его раскладку не запоминаем
+        if extruder.budget_exceeded is not None:
+            return
+
+        if self.layouts is not None and extruder.layout is not None and extruder.layout != self.layouts.get(slug):
+            self.layouts.set(slug, extruder.layout)
+
+    def load_cached_items(self, extruder, source_file, **kwargs):
+        # При попадании в кэш товары берутся из него, а файл не открывается и заголовки не ищутся.
+        # Возвращает ключ, под которым нужно сохранить результат разбора
+        if self.cache is None:
+            return None
+
+        options = {key: value for key, value in kwargs.items() if key not in self.cache.ignored_options}
+        options['extruder'] = type(extruder).__name__
+
+        with extruder.stats.stage('cache'):
+            cache_key = self.cache.get_key(source_file, extruder.header_signatures, options)
+            items = self.cache.get(cache_key)
+
+        if items is not None:
+            extruder.items = items
+            extruder.from_cache = True
+
+        return cache_key
+
+    def store_cached_items(self, extruder, cache_key):
+        # Неполный результат, остановленный по лимиту, не кэшируем
+        if cache_key is not None and extruder.budget_exceeded is None:
+            self.cache.set(cache_key, extruder.items)
+
+    def _run_isolated(self, options):
+        with ProcessPoolExecutor(max_workers=1) as executor:
+            return self._run_task(executor.submit(load_data_source, options, self.cache).result)
+
+    @staticmethod
+    def _run_task(function, *args):
+        try:
+            return function(*args), None
+        except Exception as e:
+            return None, e
+
+    def get_extruder(self, source_file, header_signatures=None, replace_header_signatures=False, **kwargs):
+        # Источник – путь к файлу, байты, mmap или файловый объект. Формат определяем по содержимому,
+        # а если его не удалось узнать – по расширению файла
+        file_type = None
+
+        if not is_path(source_file) or isfile(source_file):
+            file_type = self.sniff_file_type(source_file)
+
+        if file_type is None and is_path(source_file):
+            file_type = self.detect_file_type(path=source_file)
 
         if file_type == 'xls':
             extruder = XlsExtruder(source_file, **kwargs)
@@ -19,15 +198,10 @@ class PricelistParser(object):
         else:
             raise ValueError(f'Unsupported file type {file_type}. Please use one of xls, xlsx or csv instead')
 
-        if slug is None:
-            slug = self.get_slug_from_path(path=source_file)
-
         if header_signatures is not None:
             extruder.update_header_signatures(signatures=header_signatures, replace=replace_header_signatures)
 
-        self.data_sources[slug] = extruder.load_data(**kwargs)
-
-        return self.data_sources[slug]
+        return extruder
 
     @staticmethod
     def detect_file_type(path):
@@ -38,13 +212,76 @@ class PricelistParser(object):
         else:
             return None
 
+    @staticmethod
+    def sniff_file_type(source):
+        return sniff_file_type(source)
+
+    def get_slug(self, source):
+        if is_path(source):
+            return self.get_slug_from_path(path=source)
+
+        # У открытых файлов берем имя, если оно есть
+        name = getattr(source, 'name', None)
+
+        if isinstance(name, str):
+            return self.get_slug_from_path(path=name)
+
+        raise ValueError('Please provide a slug for data sources without a file name')
+
     @staticmethod
     def get_slug_from_path(path):
         return splitext(basename(path))[0]
 
 
-def parse_pricelist(pricelist_file, **kwargs):
-    parser = PricelistParser()
-    parser.add_data_source(source_file=pricelist_file, slug='default', **kwargs)
+def load_data_source(options, cache=None):
+    extruder = PricelistParser(cache=cache).add_data_source(**options)
+
+    # Открытую книгу нельзя передать в другой процесс, а товары уже извлечены
+    extruder.loaded_file = None
+
+    return extruder
+
+
+def check_partial_budget(kwargs):
+    # Эти функции возвращают только товары, и по ним не узнать, что разбор остановился по лимиту.
+    # Неполный результат можно получить через PricelistParser, там превышенный лимит в extruder.budget_exceeded
+    budget = kwargs['budget'] if 'budget' in kwargs else None
+
+    if budget is not None and budget.partial:
+        raise ValueError('Partial parse budgets are not supported here. Please use PricelistParser.add_data_source and check extruder.budget_exceeded instead')
+
+
+def iter_pricelist(pricelist_file, header_signatures=None, replace_header_signatures=False, **kwargs):
+    # Товары отдаются по одному по мере чтения файла, весь прайслист в памяти не держится
+    check_partial_budget(kwargs)
+
+    extruder = PricelistParser().get_extruder(pricelist_file, header_signatures=header_signatures, replace_header_signatures=replace_header_signatures, **kwargs)
+
+    return extruder.iter_items(**kwargs)
+
+
+def parse_pricelist(pricelist_file, as_columns=False, header_signatures=None, replace_header_signatures=False, **kwargs):
+    check_partial_budget(kwargs)
+
+    if as_columns:
+        # Столбцы заполняются прямо при обходе строк, объекты товаров не создаются
+        extruder = PricelistParser().get_extruder(pricelist_file, header_signatures=header_signatures, replace_header_signatures=replace_header_signatures, **kwargs)
+
+        return extruder.load_columns(**kwargs)
+
+    return list(iter_pricelist(pricelist_file, header_signatures=header_signatures, replace_header_signatures=replace_header_signatures, **kwargs))
+
+
+def aiter_pricelist(pricelist_file, header_signatures=None, replace_header_signatures=False, executor=None, chunk_size=100, **kwargs):
+    # Асинхронный вариант iter_pricelist: чтение файла и разбор строк выполняются в executor (по умолчанию – пул
+    # потоков цикла событий), товары отдаются пачками по chunk_size по мере того, как потребитель их забирает.
+    # Формат файла определяется тоже в executor, вместе с первой пачкой
+    return aiter_blocking(partial(iter_pricelist, pricelist_file, header_signatures=header_signatures, replace_header_signatures=replace_header_signatures, **kwargs), executor=executor, chunk_size=chunk_size)
+
+
+async def parse_pricelist_async(pricelist_file, executor=None, chunk_size=100, **kwargs):
+    if isinstance(executor, ProcessPoolExecutor):
+        # В другой процесс можно передать только разбор файла целиком
+        return await asyncio.get_running_loop().run_in_executor(executor, partial(parse_pricelist, pricelist_file, **kwargs))
 
-    return parser.data_sources['default'].items
+    return [item async for item in aiter_pricelist(pricelist_file, executor=executor, chunk_size=chunk_size, **kwargs)]
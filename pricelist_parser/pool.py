@@ -0,0 +1,47 @@
+class ValuePool(object):
+    # Пул строковых значений ячеек. В прайслистах одни и те же бренды, единицы измерения и «в наличии» повторяются
+    # в сотнях тысяч строк, а пул отдает для равных строк один и тот же объект, так что в памяти хранится
+    # одна копия. Пул можно разделить между несколькими файлами. Числа и прочие значения не трогаем.
+    # При разборе листов в потоках счетчики попаданий приблизительные
+    def __init__(self):
+        self.values = {}
+        self.hits = 0
+        self.misses = 0
+
+    def intern(self, value):
+        if type(value) is not str:
+            return value
+
+        pooled = self.values.get(value)
+
+        if pooled is None:
+            self.values[value] = value
+            self.misses += 1
+
+            return value
+
+        self.hits += 1
+
+        return pooled
+
+    @property
+    def hit_rate(self):
+        total = self.hits + self.misses
+
+        return self.hits / total if total else 0.0
+
+    def clear(self):
+        self.values.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def to_dict(self):
+        return {
+            'size': len(self.values),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hit_rate,
+        }
+
+    def __len__(self):
+        return len(self.values)
@@ -1,41 +1,140 @@
+from functools import lru_cache
 from price_parser import Price
 
+_digits = frozenset('0123456789')
+
+
+def parse_price(value):
+    value_type = type(value)
+
+    # Числа из xlrd/openpyxl разбираем без price_parser. Результат должен совпадать с разбором строки,
+    # поэтому быстрый путь только для записи вида «123» или «123.45». Отрицательные числа, экспонента и ровно
+    # три знака после точки (price_parser считает точку разделителем тысяч) идут обычным путем
+    if value_type is float or value_type is int:
+        text = str(value)
+        integer_part, _, fraction_part = text.partition('.')
+
+        if len(fraction_part) != 3 and _digits.issuperset(integer_part) and _digits.issuperset(fraction_part):
+            return float(value)
+
+        return _parse_price_string(text)
+
+    return _parse_price_string(str(value))
+
+
+@lru_cache(maxsize=16384)
+def _parse_price_string(text):
+    # В прайслистах одни и те же цены повторяются, поэтому разбор строк кэшируем
+    return Price.fromstring(text).amount_float
+
+
+def parse_sku(value):
+    if value is None:
+        return ''
+
+    return str(value).strip()
+
 
 class PricelistParserItem(object):
+    # Значения известных типов заголовков хранятся в слотах, чтобы у каждого товара не было своего словаря.
+    # Все остальные поля складываются в _extra, который создается только при необходимости
+    _fields = ('sku', 'price', 'quantity', 'name', 'description', 'dimensions', 'weight', 'link', 'vat', 'order')
+    _fields_set = frozenset(_fields)
+
+    __slots__ = _fields + ('_extra',)
+
     def __init__(self, **kwargs):
-        self.data = {}
+        self._extra = None
 
         if 'sku' in kwargs:
-            self.data['sku'] = self._process_as_string(kwargs.pop('sku'))
+            self.sku = parse_sku(kwargs.pop('sku'))
 
         if 'price' in kwargs:
-            self.data['price'] = Price.fromstring(str(kwargs.pop('price'))).amount_float
+            self.price = parse_price(kwargs.pop('price'))
+
+        for key, value in kwargs.items():
+            self._set_field(key, value)
 
-        self.data = {**self.data, **kwargs}
+    @property
+    def data(self):
+        return {key: self[key] for key in self.keys()}
 
     def keys(self):
-        return self.data.keys()
+        keys = [key for key in self._fields if self._has_field(key)]
+
+        if self._extra is not None:
+            keys.extend(self._extra.keys())
+
+        return keys
 
     def __getattr__(self, name):
-        if name in self.data.keys():
-            return self.data[name]
+        # Сюда попадаем, только если обычный поиск атрибута не сработал: незаполненный слот или произвольное поле
+        if name.startswith('__'):
+            raise AttributeError(name)
+
+        try:
+            extra = object.__getattribute__(self, '_extra')
+        except AttributeError:
+            return None
+
+        if extra is not None and name in extra:
+            return extra[name]
 
     def __getitem__(self, key):
-        return self.data[key]
+        if key in self._fields_set:
+            try:
+                return object.__getattribute__(self, key)
+            except AttributeError:
+                raise KeyError(key)
+
+        if self._extra is None:
+            raise KeyError(key)
+
+        return self._extra[key]
+
+    def __getstate__(self):
+        return self.data
+
+    def __setstate__(self, state):
+        self._extra = None
+
+        for key, value in state.items():
+            self._set_field(key, value)
+
+    def _set_field(self, key, value):
+        if key in self._fields_set:
+            setattr(self, key, value)
+        else:
+            if self._extra is None:
+                self._extra = {}
+
+            self._extra[key] = value
+
+    def _has_field(self, key):
+        try:
+            object.__getattribute__(self, key)
+        except AttributeError:
+            return False
+
+        return True
 
     @staticmethod
     def _process_as_string(value):
-        return str(value).strip()
+        return parse_sku(value)
 
     @staticmethod
     def _process_as_number(value):
         return float(value)
 
     def is_valid(self):
-        if 'price' not in self.data.keys() or self.data['price'] is None:
-            return False
+        return self.validation_error() is None
 
-        if 'sku' not in self.data.keys() or len(self.data['sku']) == 0:
-            return False
+    def validation_error(self):
+        # Причина, по которой строка не считается товаром, или None. Незаполненные слоты через __getattr__ возвращают None
+        if self.price is None:
+            return 'missing_price'
 
-        return True
+        if self.sku is None or len(self.sku) == 0:
+            return 'missing_sku'
+
+        return None
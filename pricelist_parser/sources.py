@@ -0,0 +1,216 @@
+import codecs
+import io
+import mmap
+import os
+import zipfile
+from contextlib import contextmanager
+
+OLE2_SIGNATURE = b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1'
+ZIP_SIGNATURE = b'PK\x03\x04'
+
+# Метка UTF-32 LE начинается с метки UTF-16 LE, поэтому UTF-32 проверяем раньше
+BOMS = [
+    (codecs.BOM_UTF8, 'utf-8-sig'),
+    (codecs.BOM_UTF32_LE, 'utf-32'),
+    (codecs.BOM_UTF32_BE, 'utf-32'),
+    (codecs.BOM_UTF16_LE, 'utf-16'),
+    (codecs.BOM_UTF16_BE, 'utf-16'),
+]
+# Частые буквы русского текста. По ним выбираем однобайтовую кодировку, в которой образец читается осмысленно
+COMMON_LETTERS = frozenset('оеаинтсрвлкмдпуяыьгзбчйхжшюцщэфъё')
+
+
+# Источник прайслиста – путь к файлу, байты (bytes, bytearray, memoryview, mmap) или открытый файловый объект
+
+
+def is_path(source):
+    return isinstance(source, (str, os.PathLike))
+
+
+def is_buffer(source):
+    return isinstance(source, (bytes, bytearray, memoryview, mmap.mmap))
+
+
+class MappedFile(io.RawIOBase):
+    # Файловый объект поверх mmap: zipfile и TextIOWrapper требуют методов, которых у mmap нет
+    def __init__(self, mapped, owns_mapping=True):
+        self.mapped = mapped
+        self.owns_mapping = owns_mapping
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        self.mapped.seek(offset, whence)
+        return self.mapped.tell()
+
+    def tell(self):
+        return self.mapped.tell()
+
+    def readinto(self, buffer):
+        data = self.mapped.read(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+    def read(self, size=-1):
+        return self.mapped.read(size if size is not None and size >= 0 else None)
+
+    def close(self):
+        if self.owns_mapping and not self.mapped.closed:
+            self.mapped.close()
+
+        super().close()
+
+
+def map_file(path):
+    with open(path, 'rb') as file_object:
+        return MappedFile(mmap.mmap(file_object.fileno(), 0, access=mmap.ACCESS_READ))
+
+
+def open_binary(source, use_mmap=False):
+    # Возвращает двоичный файловый объект и признак того, что закрыть его должны мы.
+    # Чужие файловые объекты только перематываются в начало и не закрываются
+    if is_path(source):
+        if use_mmap and os.path.getsize(source) > 0:
+            return map_file(source), True
+
+        return open(source, 'rb'), True
+
+    if isinstance(source, mmap.mmap):
+        source.seek(0)
+        return MappedFile(source, owns_mapping=False), False
+
+    if is_buffer(source):
+        return io.BytesIO(source), True
+
+    source.seek(0)
+    return source, False
+
+
+def read_bytes(source):
+    if isinstance(source, bytes):
+        return source
+
+    if is_buffer(source):
+        return bytes(source)
+
+    if is_path(source):
+        with open(source, 'rb') as file_object:
+            return file_object.read()
+
+    source.seek(0)
+    return source.read()
+
+
+def read_head(source, size):
+    if is_path(source):
+        with open(source, 'rb') as file_object:
+            return file_object.read(size)
+
+    if is_buffer(source):
+        return bytes(source[:size])
+
+    position = source.tell()
+
+    try:
+        source.seek(0)
+        return source.read(size)
+    finally:
+        source.seek(position)
+
+
+@contextmanager
+def open_text(source, encoding, use_mmap=False):
+    if is_path(source) and not use_mmap:
+        with open(source, 'r', encoding=encoding, newline='') as file_object:
+            yield file_object
+
+        return
+
+    if isinstance(source, io.TextIOBase):
+        source.seek(0)
+        yield source
+
+        return
+
+    binary, owned = open_binary(source, use_mmap=use_mmap)
+
+    if isinstance(binary, io.RawIOBase):
+        binary = io.BufferedReader(binary)
+
+    text = io.TextIOWrapper(binary, encoding=encoding, newline='')
+
+    try:
+        yield text
+    finally:
+        # Отвязываем обертку, чтобы она не закрыла чужой файловый объект
+        text.detach()
+
+        if owned:
+            binary.close()
+
+
+def sniff_file_type(source):
+    # Определяем формат по содержимому: OLE2 – xls, ZIP с книгой Excel внутри – xlsx, текст с меткой BOM
+    # или без нулевых байтов – csv. В UTF-16 и UTF-32 нулевые байты есть почти в каждом символе
+    head = read_head(source, 4096)
+
+    if isinstance(head, str):
+        return 'csv'
+
+    if head.startswith(OLE2_SIGNATURE):
+        return 'xls'
+
+    if head.startswith(ZIP_SIGNATURE):
+        return 'xlsx' if is_xlsx_archive(source) else None
+
+    if any(head.startswith(bom) for bom, encoding in BOMS):
+        return 'csv'
+
+    if len(head) > 0 and b'\x00' not in head:
+        return 'csv'
+
+    return None
+
+
+def is_xlsx_archive(source):
+    binary, owned = open_binary(source)
+
+    try:
+        with zipfile.ZipFile(binary) as archive:
+            return 'xl/workbook.xml' in archive.namelist()
+    except zipfile.BadZipFile:
+        return False
+    finally:
+        if owned:
+            binary.close()
+        else:
+            binary.seek(0)
+
+
+def detect_encoding(sample, candidates=('cp1251', 'koi8_r', 'cp866')):
+    # Кодировка по началу файла: метка BOM, затем utf-8, затем однобайтовая кодировка из candidates,
+    # в которой больше всего частых строчных русских букв. Образец может обрываться посреди символа
+    for bom, encoding in BOMS:
+        if sample.startswith(bom):
+            return encoding
+
+    try:
+        codecs.getincrementaldecoder('utf-8')().decode(sample, final=False)
+        return 'utf-8'
+    except UnicodeDecodeError:
+        pass
+
+    best_encoding, best_score = None, -1
+
+    for encoding in candidates:
+        text = sample.decode(encoding, errors='replace')
+        score = sum(1 for char in text if char in COMMON_LETTERS)
+
+        if score > best_score:
+            best_encoding, best_score = encoding, score
+
+    return best_encoding
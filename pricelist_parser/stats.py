@@ -0,0 +1,93 @@
+import threading
+import time
+from contextlib import contextmanager
+
+
+class ParseStats(object):
+    # Статистика разбора: время этапов в целом и по листам, счетчики (прочитанные строки и ячейки, товары)
+    # и причины, по которым строки не стали товарами. Счетчики копятся локально и сбрасываются сюда один раз
+    # на этап, поэтому статистику можно не отключать. hooks – функции hook(stage, seconds, sheet_name),
+    # которые вызываются по завершении каждого этапа
+    def __init__(self, hooks=None):
+        self.hooks = list(hooks) if hooks is not None else []
+        self.timings = {}
+        self.counters = {}
+        self.rejected = {}
+        self.sheets = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def stage(self, name, sheet_name=None):
+        started = time.perf_counter()
+
+        try:
+            yield
+        finally:
+            self.add_timing(name, time.perf_counter() - started, sheet_name=sheet_name)
+
+    def add_timing(self, name, seconds, sheet_name=None):
+        with self._lock:
+            for target in self._get_targets(sheet_name):
+                self._add(target['timings'], name, seconds)
+
+        for hook in self.hooks:
+            hook(name, seconds, sheet_name)
+
+    def add_counters(self, counters, rejected=None, sheet_name=None):
+        with self._lock:
+            for target in self._get_targets(sheet_name):
+                for name, value in counters.items():
+                    self._add(target['counters'], name, value)
+
+                for reason, value in (rejected or {}).items():
+                    self._add(target['rejected'], reason, value)
+
+    def merge(self, other):
+        # Статистика разбора листа в другом процессе
+        with self._lock:
+            self._merge_values(self.to_dict(), other.to_dict())
+
+            for sheet_name, sheet in other.sheets.items():
+                self._merge_values(self._get_sheet(sheet_name), sheet)
+
+    def to_dict(self):
+        return {
+            'timings': self.timings,
+            'counters': self.counters,
+            'rejected': self.rejected,
+            'sheets': self.sheets,
+        }
+
+    def __getstate__(self):
+        # Блокировку и функции обратного вызова в другой процесс не передаем
+        state = self.__dict__.copy()
+        del state['_lock']
+        state['hooks'] = []
+
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def _get_targets(self, sheet_name):
+        if sheet_name is None:
+            return [self.to_dict()]
+
+        return [self.to_dict(), self._get_sheet(sheet_name)]
+
+    def _get_sheet(self, sheet_name):
+        if sheet_name not in self.sheets:
+            self.sheets[sheet_name] = {'timings': {}, 'counters': {}, 'rejected': {}}
+
+        return self.sheets[sheet_name]
+
+    @classmethod
+    def _merge_values(cls, target, source):
+        for key in ('timings', 'counters', 'rejected'):
+            for name, value in source[key].items():
+                cls._add(target[key], name, value)
+
+    @staticmethod
+    def _add(values, name, value):
+        values[name] = values.get(name, 0) + value
@@ -0,0 +1,376 @@
+import posixpath
+import re
+import zipfile
+from datetime import datetime, timedelta
+from xml.etree.ElementTree import iterparse
+
+# Легкое чтение XLSX без openpyxl: листы и общие строки читаются прямо из архива потоковым XML-парсером,
+# строки отдаются кортежами значений. Повторяет ту часть API openpyxl в режиме read_only, которой пользуется
+# XlsxExtruder: sheetnames, wb[name], title, max_row, max_column, iter_rows(values_only=True) и cell().value
+
+RELATIONSHIPS_NS = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships'
+PACKAGE_RELATIONSHIPS_NS = 'http://schemas.openxmlformats.org/package/2006/relationships'
+
+# Встроенные форматы чисел с датами и временем
+DATE_FORMAT_IDS = frozenset(list(range(14, 23)) + [45, 46, 47])
+# Символы даты в пользовательском формате вне кавычек и квадратных скобок
+DATE_FORMAT_CODE = re.compile(r'[dmyhs]', re.IGNORECASE)
+QUOTED_FORMAT_PART = re.compile(r'"[^"]*"|\[[^\]]*\]|\\.')
+
+EXCEL_EPOCH = datetime(1899, 12, 30)
+EXCEL_1904_EPOCH = datetime(1904, 1, 1)
+SECONDS_PER_DAY = 24 * 60 * 60
+
+_column_indexes = {}
+
+
+def column_index(reference):
+    # Номер столбца (с единицы) по адресу ячейки, например B12 → 2
+    letters = reference.rstrip('0123456789')
+
+    try:
+        return _column_indexes[letters]
+    except KeyError:
+        index = 0
+
+        for letter in letters:
+            index = index * 26 + ord(letter) - 64
+
+        _column_indexes[letters] = index
+
+        return index
+
+
+def get_namespace(tag):
+    return tag[:tag.index('}') + 1] if tag.startswith('{') else ''
+
+
+class SharedStrings(object):
+    # Общие строки книги. Файл разбирается по мере обращения к строкам: пока на листе встречаются только первые
+    # строки таблицы, остальные не читаются
+    def __init__(self, archive, path):
+        self.archive = archive
+        self.path = path
+        self.strings = []
+        self._events = None
+        self._file = None
+
+    def __getitem__(self, index):
+        strings = self.strings
+
+        while index >= len(strings):
+            if not self._read_next():
+                raise IndexError(index)
+
+        return strings[index]
+
+    def _read_next(self):
+        if self._events is None:
+            if self.path is None or self.path not in self.archive.namelist():
+                return False
+
+            self._file = self.archive.open(self.path)
+            self._events = iterparse(self._file, events=('start', 'end'))
+            self._root = None
+
+        for event, element in self._events:
+            if self._root is None:
+                self._root = element
+                namespace = get_namespace(element.tag)
+                self._si_tag = namespace + 'si'
+                self._t_tag = namespace + 't'
+                self._rph_tag = namespace + 'rPh'
+                continue
+
+            if event == 'end' and element.tag == self._si_tag:
+                self.strings.append(self._get_text(element))
+                self._root.clear()
+
+                return True
+
+        self.close()
+
+        return False
+
+    def _get_text(self, element):
+        # Строка – либо один <t>, либо несколько фрагментов форматированного текста. Фонетические подсказки пропускаем
+        text = []
+
+        for child in element:
+            if child.tag == self._t_tag:
+                text.append(child.text or '')
+            elif child.tag != self._rph_tag:
+                text.extend(t.text or '' for t in child.iter(self._t_tag))
+
+        return ''.join(text)
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+class XlsxCell(object):
+    __slots__ = ('value',)
+
+    def __init__(self, value):
+        self.value = value
+
+
+class XlsxSheet(object):
+    def __init__(self, workbook, title, path):
+        self.workbook = workbook
+        self.title = title
+        self.path = path
+        self._dimensions = None
+
+    @property
+    def max_row(self):
+        return self._get_dimensions()[0]
+
+    @property
+    def max_column(self):
+        return self._get_dimensions()[1]
+
+    def _get_dimensions(self):
+        # Размер листа из <dimension>, который идет перед данными. Если его нет, размер неизвестен, как в openpyxl
+        if self._dimensions is None:
+            self._dimensions = (None, None)
+
+            with self.workbook.archive.open(self.path) as file_object:
+                for event, element in iterparse(file_object, events=('start',)):
+                    tag = element.tag.rsplit('}', 1)[-1]
+
+                    if tag == 'dimension':
+                        last_cell = element.get('ref', '').split(':')[-1]
+                        row = last_cell.lstrip('ABCDEFGHIJKLMNOPQRSTUVWXYZ')
+
+                        if row.isdigit():
+                            self._dimensions = (int(row), column_index(last_cell))
+
+                        break
+
+                    if tag == 'sheetData':
+                        break
+
+        return self._dimensions
+
+    def cell(self, row, column):
+        for values in self.iter_rows(min_row=row, max_row=row, min_col=column, max_col=column, values_only=True):
+            return XlsxCell(values[0])
+
+        return XlsxCell(None)
+
+    def iter_rows(self, min_row=None, max_row=None, min_col=None, max_col=None, values_only=True):
+        # Как и openpyxl, отдаем и пустые строки, а строки дополняем пустыми значениями до max_col
+        min_row = min_row or 1
+        min_col = min_col or 1
+        max_col = max_col or self.max_column
+
+        if max_row is None and self.max_row is not None:
+            max_row = self.max_row
+
+        width = max_col - min_col + 1 if max_col is not None else None
+        empty_row = (None,) * width if width is not None else ()
+        next_row = min_row
+
+        for row_idx, values in self._iter_sheet_rows(min_row, max_row, min_col, max_col):
+            while next_row < row_idx:
+                yield empty_row
+                next_row += 1
+
+            if width is not None and len(values) < width:
+                values.extend([None] * (width - len(values)))
+
+            yield tuple(values)
+            next_row = row_idx + 1
+
+        # Пустые строки в конце листа есть только у листов с известным размером
+        if max_row is not None and self.max_row is not None:
+            while next_row <= min(max_row, self.max_row):
+                yield empty_row
+                next_row += 1
+
+    def _iter_sheet_rows(self, min_row, max_row, min_col, max_col):
+        # Номера строк и значения из [min_col, max_col]. Лишние строки и ячейки пропускаем, не разбирая значений
+        workbook = self.workbook
+        shared_strings = workbook.shared_strings
+        date_styles = workbook.date_styles
+        convert_date = workbook.convert_date
+
+        with workbook.archive.open(self.path) as file_object:
+            events = iterparse(file_object, events=('start', 'end'))
+            sheet_data = None
+            row_tag = cell_tag = value_tag = inline_tag = text_tag = None
+            row_idx = 0
+
+            for event, element in events:
+                if sheet_data is None:
+                    if event == 'start' and element.tag.endswith('sheetData'):
+                        sheet_data = element
+                        namespace = get_namespace(element.tag)
+                        row_tag, cell_tag, value_tag = namespace + 'row', namespace + 'c', namespace + 'v'
+                        inline_tag, text_tag = namespace + 'is', namespace + 't'
+
+                    continue
+
+                if event != 'end' or element.tag != row_tag:
+                    continue
+
+                reference = element.get('r')
+                row_idx = int(reference) if reference is not None else row_idx + 1
+
+                if row_idx < min_row:
+                    sheet_data.clear()
+                    continue
+
+                if max_row is not None and row_idx > max_row:
+                    break
+
+                values = []
+                col_idx = min_col - 1
+
+                for cell in element:
+                    if cell.tag != cell_tag:
+                        continue
+
+                    reference = cell.get('r')
+                    col_idx = column_index(reference) if reference is not None else col_idx + 1
+
+                    if col_idx < min_col:
+                        continue
+
+                    if max_col is not None and col_idx > max_col:
+                        break
+
+                    cell_type = cell.get('t')
+
+                    if cell_type == 'inlineStr':
+                        value = ''.join(text.text or '' for text in cell.iter(text_tag)) if cell.find(inline_tag) is not None else None
+                    else:
+                        value_element = cell.find(value_tag)
+                        value = value_element.text if value_element is not None else None
+
+                        if value is not None:
+                            if cell_type == 's':
+                                value = shared_strings[int(value)]
+                            elif cell_type is None or cell_type == 'n':
+                                value = float(value) if '.' in value or 'E' in value or 'e' in value else int(value)
+
+                                if date_styles and cell.get('s') in date_styles:
+                                    value = convert_date(value)
+                            elif cell_type == 'b':
+                                value = value == '1'
+
+                    position = col_idx - min_col
+
+                    if position > len(values):
+                        values.extend([None] * (position - len(values)))
+
+                    values.append(value)
+
+                sheet_data.clear()
+
+                yield row_idx, values
+
+
+class XlsxReader(object):
+    read_only = True
+
+    def __init__(self, file_object):
+        self.archive = zipfile.ZipFile(file_object)
+        self.sheets = {}
+        self.sheetnames = []
+        self.date1904 = False
+
+        relationships = self._read_relationships('xl/_rels/workbook.xml.rels')
+        shared_strings_path = None
+
+        for target, relationship_type in relationships.values():
+            if relationship_type.endswith('/sharedStrings'):
+                shared_strings_path = target
+
+        for event, element in iterparse(self.archive.open('xl/workbook.xml'), events=('end',)):
+            tag = element.tag.rsplit('}', 1)[-1]
+
+            if tag == 'sheet':
+                name = element.get('name')
+                target, relationship_type = relationships[element.get(f'{{{RELATIONSHIPS_NS}}}id')]
+
+                self.sheetnames.append(name)
+                self.sheets[name] = XlsxSheet(self, name, target)
+            elif tag == 'workbookPr':
+                self.date1904 = element.get('date1904') in ('1', 'true')
+
+        self.shared_strings = SharedStrings(self.archive, shared_strings_path)
+        self.date_styles = self._read_date_styles(relationships)
+        self.epoch = EXCEL_1904_EPOCH if self.date1904 else EXCEL_EPOCH
+
+    def __getitem__(self, name):
+        return self.sheets[name]
+
+    def convert_date(self, value):
+        # Как в openpyxl: время округляется до миллисекунд, дробь меньше суток – это время без даты,
+        # а в системе 1900 до 1 марта 1900 учитываем несуществующее 29 февраля
+        day, fraction = divmod(value, 1)
+        time_part = timedelta(milliseconds=round(fraction * SECONDS_PER_DAY * 1000))
+
+        if 0 <= value < 1 and time_part.days == 0:
+            return (datetime.min + time_part).time()
+
+        if 0 < value < 60 and not self.date1904:
+            day += 1
+
+        return self.epoch + timedelta(days=day) + time_part
+
+    def close(self):
+        self.shared_strings.close()
+        self.archive.close()
+
+    def _read_relationships(self, path):
+        relationships = {}
+
+        with self.archive.open(path) as file_object:
+            for event, element in iterparse(file_object, events=('end',)):
+                if element.tag == f'{{{PACKAGE_RELATIONSHIPS_NS}}}Relationship':
+                    target = element.get('Target')
+                    # Пути бывают и от корня архива, и относительно каталога xl
+                    target = target.lstrip('/') if target.startswith('/') else posixpath.normpath(posixpath.join('xl', target))
+                    relationships[element.get('Id')] = (target, element.get('Type'))
+
+        return relationships
+
+    def _read_date_styles(self, relationships):
+        # Номера стилей ячеек, в которых числа – это даты. Их, как и openpyxl, превращаем в datetime
+        styles_path = next((target for target, relationship_type in relationships.values() if relationship_type.endswith('/styles')), None)
+
+        if styles_path is None or styles_path not in self.archive.namelist():
+            return frozenset()
+
+        date_formats = set(DATE_FORMAT_IDS)
+        date_styles = set()
+        style_idx = 0
+        in_cell_formats = False
+
+        with self.archive.open(styles_path) as file_object:
+            for event, element in iterparse(file_object, events=('start', 'end')):
+                tag = element.tag.rsplit('}', 1)[-1]
+
+                if event == 'start':
+                    in_cell_formats = in_cell_formats or tag == 'cellXfs'
+                    continue
+
+                if tag == 'numFmt':
+                    code = QUOTED_FORMAT_PART.sub('', element.get('formatCode', ''))
+
+                    if DATE_FORMAT_CODE.search(code):
+                        date_formats.add(int(element.get('numFmtId')))
+                elif tag == 'xf' and in_cell_formats:
+                    if int(element.get('numFmtId', 0)) in date_formats:
+                        date_styles.add(str(style_idx))
+
+                    style_idx += 1
+                elif tag == 'cellXfs':
+                    break
+
+        return frozenset(date_styles)
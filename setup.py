@@ -18,6 +18,9 @@ setuptools.setup(
         'xlrd',
         'openpyxl',
     ],
+    extras_require={
+        'columns': ['numpy'],
+    },
     classifiers=[
         'Development Status :: 4 - Beta',
         'Intended Audience :: Developers',
@@ -25,5 +28,5 @@ setuptools.setup(
         'License :: OSI Approved :: MIT License',
         'Operating System :: OS Independent',
     ],
-    python_requires='>=3.6',
+    python_requires='>=3.7',
 )
@@ -0,0 +1,118 @@
+import asyncio
+import pytest
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from pricelist_parser import PricelistParser, aiter_pricelist, parse_pricelist, parse_pricelist_async
+from pricelist_parser.aio import aiter_blocking
+
+
+class Producer(object):
+    def __init__(self, total):
+        self.total = total
+        self.produced = 0
+        self.closed = threading.Event()
+
+    def __call__(self):
+        try:
+            for idx in range(self.total):
+                self.produced += 1
+                yield idx
+        finally:
+            self.closed.set()
+
+
+def test_aiter_pricelist(current_path):
+    async def collect():
+        return [dict(item) async for item in aiter_pricelist(current_path + '/samples/sample.xls', chunk_size=50)]
+
+    items = asyncio.run(collect())
+
+    assert items == [dict(item) for item in parse_pricelist(current_path + '/samples/sample.xls')]
+
+
+@pytest.mark.parametrize('executor_class', [ThreadPoolExecutor, ProcessPoolExecutor])
+def test_parse_pricelist_async(current_path, executor_class):
+    async def parse(executor):
+        return await parse_pricelist_async(current_path + '/samples/sample.xls', executor=executor, header_signatures={'title': ['заголовок']})
+
+    with executor_class(max_workers=2) as executor:
+        items = asyncio.run(parse(executor))
+
+    assert len(items) == 679
+    assert items[0].title == 'Здесь нужно что-то написать'
+
+
+@pytest.mark.parametrize('executor_class', [ThreadPoolExecutor, ProcessPoolExecutor])
+def test_add_data_source_async(current_path, executor_class):
+    parser = PricelistParser()
+
+    with executor_class(max_workers=2) as executor:
+        asyncio.run(parser.add_data_source_async(current_path + '/samples/sample.xlsx', executor=executor, read_only=True))
+
+    assert len(parser.data_sources['sample'].items) == 679
+
+
+def test_aiter_pricelist_rejects_process_executor(current_path):
+    async def collect(executor):
+        return [item async for item in aiter_pricelist(current_path + '/samples/sample.xls', executor=executor)]
+
+    with ProcessPoolExecutor(max_workers=1) as executor:
+        with pytest.raises(ValueError):
+            asyncio.run(collect(executor))
+
+
+def test_aiter_blocking_backpressure():
+    producer = Producer(total=1000)
+
+    async def take_one():
+        items = aiter_blocking(producer, chunk_size=10)
+
+        async for item in items:
+            assert producer.produced == 10
+            await items.aclose()
+            return item
+
+    assert asyncio.run(take_one()) == 0
+    assert producer.closed.wait(timeout=5)
+    assert producer.produced == 10
+
+
+def test_aiter_blocking_cancellation():
+    producer = Producer(total=10 ** 9)
+    consumed = []
+
+    async def consume():
+        async for item in aiter_blocking(producer, chunk_size=100):
+            consumed.append(item)
+            await asyncio.sleep(0)
+
+    async def run():
+        task = asyncio.create_task(consume())
+        await asyncio.sleep(0.05)
+        task.cancel()
+
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(run())
+
+    assert producer.closed.wait(timeout=5)
+    assert producer.produced < 10 ** 9
+
+
+def test_aiter_blocking_close_error():
+    def produce():
+        try:
+            yield from range(1000)
+        finally:
+            raise OSError('close failed')
+
+    async def take_one():
+        items = aiter_blocking(produce, chunk_size=10)
+
+        async for item in items:
+            await items.aclose()
+
+    with pytest.raises(OSError):
+        asyncio.run(take_one())
@@ -0,0 +1,94 @@
+import pickle
+import pytest
+from openpyxl import load_workbook
+from openpyxl.styles import PatternFill
+
+from pricelist_parser import BudgetExceeded, ParseBudget, PricelistParser, XlsExtruder, parse_pricelist
+
+
+@pytest.fixture()
+def inflated_xlsx(current_path, tmp_path):
+    # Оформление последней строки листа раздувает max_row до 1 048 576. При потоковом чтении
+    # конец таблицы заранее не найти, и пустые строки читаются до конца листа
+    wb = load_workbook(current_path + '/samples/sample.xlsx')
+    wb['Лист с данными –\xa02']['A1048576'].fill = PatternFill('solid', fgColor='FFFF00')
+    path = str(tmp_path / 'inflated.xlsx')
+    wb.save(path)
+
+    return path
+
+
+def test_budget_max_rows(inflated_xlsx):
+    with pytest.raises(BudgetExceeded) as error:
+        parse_pricelist(inflated_xlsx, read_only=True, budget=ParseBudget(max_rows=5000))
+
+    assert error.value.limit == 'max_rows'
+    assert error.value.maximum == 5000
+    assert 'max_rows' in str(error.value)
+
+
+def test_budget_sheet_workers_trim_inflated_sheet(inflated_xlsx):
+    # Процессы открывают книгу так же, как при разборе по очереди, и пустой хвост листа не читают
+    extruder = PricelistParser().add_data_source(source_file=inflated_xlsx, slug='inflated', sheet_workers=2, budget=ParseBudget(max_rows=5000))
+
+    assert len(extruder.items) == 679
+    assert extruder.stats.counters['rows_trimmed'] > 0
+
+
+def test_budget_partial_result(inflated_xlsx):
+    extruder = PricelistParser().add_data_source(source_file=inflated_xlsx, slug='inflated', read_only=True, budget=ParseBudget(max_rows=5000, partial=True))
+
+    assert len(extruder.items) == 679
+    assert extruder.budget_exceeded.limit == 'max_rows'
+    assert extruder.budget_tracker.rows == 5001
+
+
+@pytest.mark.parametrize('budget, limit', [
+    [ParseBudget(max_seconds=0), 'max_seconds'],
+    [ParseBudget(max_cells=100), 'max_cells'],
+    [ParseBudget(max_memory=1), 'max_memory'],
+])
+def test_budget_limits(current_path, budget, limit):
+    with pytest.raises(BudgetExceeded) as error:
+        parse_pricelist(current_path + '/samples/sample.xls', budget=budget)
+
+    assert error.value.limit == limit
+
+
+def test_budget_not_exceeded(current_path):
+    budget = ParseBudget(max_seconds=60, max_rows=1000, max_cells=10000)
+
+    assert len(parse_pricelist(current_path + '/samples/sample.xls', budget=budget)) == 679
+    assert len(parse_pricelist(current_path + '/samples/sample.xlsx', budget=budget, as_columns=True)) == 833
+
+
+def test_budget_sheet_workers(current_path):
+    extruder = PricelistParser().add_data_source(source_file=current_path + '/samples/sample.xls', slug='sample', sheet_workers=2, budget=ParseBudget(max_rows=100, partial=True))
+
+    # Лимит общий для всех процессов, которые разбирают файл
+    assert len(extruder.items) < 100
+    assert extruder.budget_exceeded.limit == 'max_rows'
+    assert extruder.budget_tracker.rows == 101
+
+
+def test_budget_sheet_workers_from_constructor(current_path):
+    path = current_path + '/samples/sample.xls'
+
+    with pytest.raises(BudgetExceeded) as error:
+        XlsExtruder(path, sheet_workers=2, budget=ParseBudget(max_rows=5)).load_data()
+
+    assert (error.value.limit, error.value.value, error.value.maximum) == ('max_rows', 6, 5)
+
+    # Как и при разборе листов по очереди, действуют лимиты, переданные в конструктор
+    assert len(XlsExtruder(path, sheet_workers=2).load_data(budget=ParseBudget(max_rows=5)).items) == 679
+
+
+def test_partial_budget_rejected(current_path):
+    with pytest.raises(ValueError):
+        parse_pricelist(current_path + '/samples/sample.xls', budget=ParseBudget(max_rows=5, partial=True))
+
+
+def test_budget_exceeded_pickle():
+    error = pickle.loads(pickle.dumps(BudgetExceeded('max_rows', 11, 10)))
+
+    assert (error.limit, error.value, error.maximum) == ('max_rows', 11, 10)
@@ -0,0 +1,191 @@
+import os
+import pickle
+import pytest
+import time
+import zlib
+from datetime import date, datetime, timedelta
+
+from pricelist_parser import PricelistCache, PricelistParser, PricelistParserItem, XlsExtruder
+
+
+@pytest.fixture()
+def cache(tmp_path):
+    return PricelistCache(str(tmp_path / 'cache'))
+
+
+def test_cache_hit_skips_parsing(current_path, cache, monkeypatch):
+    path = current_path + '/samples/sample.xls'
+    parsed = PricelistParser(cache=cache).add_data_source(source_file=path, slug='sample')
+
+    def fail(*args, **kwargs):
+        raise AssertionError()
+
+    monkeypatch.setattr(XlsExtruder, 'load_file', fail)
+    monkeypatch.setattr(XlsExtruder, 'get_headers_map', fail)
+
+    with open(path, 'rb') as file_object:
+        cached = PricelistParser(cache=cache).add_data_source(source_file=file_object.read(), slug='sample')
+
+    assert parsed.from_cache is False
+    assert cached.from_cache is True
+    assert [dict(item) for item in cached.items] == [dict(item) for item in parsed.items]
+    assert all(item.is_valid() == original.is_valid() for item, original in zip(cached.items, parsed.items))
+
+
+def test_cache_key_depends_on_signatures_and_options(current_path, cache):
+    path = current_path + '/samples/sample.csv'
+
+    key = cache.get_key(path, {'sku': ['артикул']})
+
+    assert key == cache.get_key(path, {'sku': ['артикул']})
+    assert key != cache.get_key(path, {'sku': ['код']})
+    assert key != cache.get_key(path, {'sku': ['артикул']}, {'encoding': 'cp1251'})
+    assert key != cache.get_key(current_path + '/samples/sample.xls', {'sku': ['артикул']})
+
+    parser = PricelistParser(cache=cache)
+    parser.add_data_source(source_file=path, slug='sample')
+    extruder = parser.add_data_source(source_file=path, slug='sample', header_signatures={'sku': ['код']})
+
+    assert extruder.from_cache is False
+
+
+def test_cache_eviction(current_path, tmp_path):
+    cache = PricelistCache(str(tmp_path), max_age=60)
+    parser = PricelistParser(cache=cache)
+
+    parser.add_data_source(source_file=current_path + '/samples/sample.csv', slug='csv')
+    csv_entry, = os.listdir(str(tmp_path))
+
+    parser.add_data_source(source_file=current_path + '/samples/sample.xls', slug='xls')
+    xls_entry, = set(os.listdir(str(tmp_path))) - {csv_entry}
+
+    # Устаревшая запись удаляется
+    os.utime(os.path.join(str(tmp_path), csv_entry), (time.time() - 120, time.time() - 120))
+    cache.evict()
+
+    assert os.listdir(str(tmp_path)) == [xls_entry]
+
+    # При превышении размера удаляются самые давно использованные записи
+    parser.add_data_source(source_file=current_path + '/samples/sample.csv', slug='csv')
+    os.utime(os.path.join(str(tmp_path), xls_entry), (time.time() - 30, time.time() - 30))
+    cache.max_size = 1024
+
+    cache.evict()
+
+    assert os.listdir(str(tmp_path)) == [csv_entry]
+
+
+def test_cache_eviction_is_throttled(cache, monkeypatch):
+    scans = []
+    listdir = os.listdir
+    monkeypatch.setattr(os, 'listdir', lambda path: scans.append(path) or listdir(path))
+    cache.evict_every = 10
+
+    for idx in range(25):
+        cache.set(f'key-{idx}', [])
+
+    # Без лимитов каталог просматривается только раз в evict_every записей
+    assert len(scans) == 2
+
+    cache.max_size = 1024 * 1024
+    cache.evict()
+    scans.clear()
+
+    for idx in range(5):
+        cache.set(f'key-size-{idx}', [])
+
+    # Размер известен с последнего просмотра и не превышен, поэтому каталог заново не просматривается
+    assert scans == []
+
+
+def test_cache_size_limit_on_write(cache):
+    cache.max_size = 200
+    cache.set('first', [])
+    first_size = os.path.getsize(os.path.join(cache.directory, 'first' + cache.suffix))
+
+    for idx in range(200 // first_size + 5):
+        cache.set(f'key-{idx}', [])
+
+    assert sum(os.path.getsize(os.path.join(cache.directory, name)) for name in os.listdir(cache.directory)) <= 200
+
+
+def test_cache_removes_stale_temporary_files(cache):
+    stale = os.path.join(cache.directory, 'crashed.tmp')
+    fresh = os.path.join(cache.directory, 'writing.tmp')
+
+    for path in (stale, fresh):
+        with open(path, 'wb') as file_object:
+            file_object.write(b'partial')
+
+    os.utime(stale, (time.time() - 2 * cache.stale_temporary_age, time.time() - 2 * cache.stale_temporary_age))
+    cache.evict()
+
+    assert os.path.exists(fresh)
+    assert not os.path.exists(stale)
+
+
+def test_cache_ignores_broken_entries(current_path, cache):
+    path = current_path + '/samples/sample.csv'
+    key = cache.get_key(path, {})
+
+    with open(os.path.join(cache.directory, key + cache.suffix), 'wb') as file_object:
+        file_object.write(b'broken')
+
+    assert cache.get(key) is None
+    assert os.listdir(cache.directory) == []
+
+
+class Payload(object):
+    def __init__(self, path):
+        self.path = path
+
+    def __reduce__(self):
+        return os.mkdir, (self.path,)
+
+
+def test_cache_does_not_unpickle_entries(cache, tmp_path):
+    # Запись в общем каталоге мог подложить кто угодно, при чтении она не должна выполнить код
+    marker = str(tmp_path / 'executed')
+    key = 'a' * 64
+
+    with open(os.path.join(cache.directory, key + cache.suffix), 'wb') as file_object:
+        file_object.write(zlib.compress(pickle.dumps(Payload(marker))))
+
+    assert cache.get(key) is None
+    assert not os.path.exists(marker)
+
+
+def test_cache_keeps_value_types(cache):
+    values = {
+        'sku': '123',
+        'price': 100.5,
+        'quantity': 3,
+        'name': None,
+        'order': True,
+        'updated': datetime(2020, 5, 17, 12, 30),
+        'date': date(2020, 5, 17),
+        'time': datetime(2020, 5, 17, 12, 30, 15).time(),
+        'delay': timedelta(days=1, seconds=5),
+    }
+    item = PricelistParserItem.__new__(PricelistParserItem)
+    item.__setstate__(values)
+
+    cache.set('a' * 64, [item])
+    items = cache.get('a' * 64)
+
+    assert [item.data for item in items] == [values]
+    assert [type(value) for value in items[0].data.values()] == [type(value) for value in values.values()]
+
+
+def test_cache_shared_between_workers(current_path, cache):
+    sources = [
+        {'source_file': current_path + '/samples/sample.xls', 'slug': 'xls'},
+        {'source_file': current_path + '/samples/sample.xlsx', 'slug': 'xlsx'},
+    ]
+
+    first = PricelistParser(cache=cache).add_data_sources(sources, workers=2)
+    second = PricelistParser(cache=cache).add_data_sources(sources, workers=2)
+
+    assert [extruder.from_cache for extruder in first.values()] == [False, False]
+    assert [extruder.from_cache for extruder in second.values()] == [True, True]
+    assert len(second['xlsx'].items) == 679
@@ -0,0 +1,70 @@
+import pytest
+
+from pricelist_parser import PricelistColumns, parse_pricelist
+
+np = pytest.importorskip('numpy')
+
+
+@pytest.mark.parametrize('sample', ['sample.xls', 'sample.xlsx', 'sample.csv'])
+def test_columns_match_items(current_path, sample):
+    items = parse_pricelist(current_path + '/samples/' + sample)
+    columns = parse_pricelist(current_path + '/samples/' + sample, as_columns=True)
+
+    assert isinstance(columns, PricelistColumns)
+    assert columns['price'].dtype == np.float64
+    assert columns.valid.sum() == len(items)
+    assert list(columns['sku'][columns.valid]) == [item.sku for item in items]
+    assert list(columns['price'][columns.valid]) == [item.price for item in items]
+
+
+def test_columns_union_of_sheet_headers(current_path):
+    columns = parse_pricelist(current_path + '/samples/sample.xls', as_columns=True)
+
+    assert {'sku', 'price', 'description', 'dimensions', 'name'} <= set(columns.keys())
+
+    for column_type in columns.keys():
+        assert len(columns[column_type]) == len(columns)
+
+    assert len(columns.valid) == len(columns)
+
+
+def test_columns_append_rows():
+    columns = PricelistColumns()
+    columns.append_rows(['sku', 'price', 'name'], [['A-1', '100 руб.', 'Сепулька'], ['', '200', 'Заголовок раздела']])
+    columns.append_rows(['price', 'sku', 'weight', 'price'], [['1', 'B-1', 10, '300']])
+
+    assert list(columns['sku']) == ['A-1', '', 'B-1']
+    assert list(columns['price']) == [100.0, 200.0, 300.0]
+    assert list(columns['name']) == ['Сепулька', 'Заголовок раздела', None]
+    assert list(columns['weight']) == [None, None, 10]
+    assert list(columns.valid) == [True, False, True]
+
+
+def test_columns_missing_price_is_nan():
+    columns = PricelistColumns()
+    columns.append_rows(['sku', 'price'], [['A-1', 'нет в наличии']])
+
+    assert np.isnan(columns['price'][0])
+    assert list(columns.valid) == [False]
+
+
+def test_columns_to_pandas(current_path):
+    pytest.importorskip('pandas')
+
+    columns = parse_pricelist(current_path + '/samples/sample.xls', as_columns=True)
+    df = columns.to_pandas(valid_only=True)
+
+    assert len(df) == 679
+    assert df['sku'].iloc[0] == '123-ААА'
+    assert df['price'].iloc[0] == 3999.99
+
+
+def test_columns_to_arrow(current_path):
+    pytest.importorskip('pyarrow')
+
+    columns = parse_pricelist(current_path + '/samples/sample.xls', as_columns=True)
+    table = columns.to_arrow(valid_only=True)
+
+    assert table.num_rows == 679
+    assert table.column('sku')[0].as_py() == '123-ААА'
+    assert table.column('price')[0].as_py() == 3999.99
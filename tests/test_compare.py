@@ -0,0 +1,63 @@
+import pytest
+import sys
+
+from pricelist_parser import PricelistParser, PricelistParserItem, compare_prices
+
+np = pytest.importorskip('numpy')
+
+
+@pytest.fixture()
+def data_sources():
+    return {
+        'first': [PricelistParserItem(sku='A', price=100), PricelistParserItem(sku='B', price=50), PricelistParserItem(sku='B', price=40)],
+        'second': [PricelistParserItem(sku='A', price=80), PricelistParserItem(sku='C', price=10)],
+        'third': [PricelistParserItem(sku='A', price=120)],
+    }
+
+
+@pytest.mark.parametrize('without_pandas', [False, True])
+def test_compare_prices(data_sources, without_pandas, monkeypatch):
+    if without_pandas:
+        monkeypatch.setitem(sys.modules, 'pandas', None)
+
+    comparison = compare_prices(data_sources)
+
+    assert list(comparison['sku']) == ['A', 'B', 'C']
+    assert list(comparison['min']) == [80.0, 40.0, 10.0]
+    assert list(comparison['max']) == [120.0, 40.0, 10.0]
+    assert list(comparison['median']) == [100.0, 40.0, 10.0]
+    assert list(comparison['spread']) == [40.0, 0.0, 0.0]
+    assert list(comparison['cheapest']) == ['second', 'first', 'second']
+    assert list(comparison['count']) == [3, 1, 1]
+    assert np.isnan(comparison.prices[1, 1])
+
+
+def test_compare_prices_min_sources(data_sources):
+    comparison = compare_prices(data_sources, min_sources=2)
+
+    assert len(comparison) == 1
+    assert list(comparison.to_pandas()['cheapest']) == ['second']
+    assert len(compare_prices(data_sources, min_sources=4)) == 0
+    assert len(compare_prices({'empty': []})) == 0
+
+
+def test_compare_prices_parser(current_path):
+    parser = PricelistParser()
+    parser.add_data_source(source_file=current_path + '/samples/sample.xls', slug='xls')
+    parser.add_data_source(source_file=current_path + '/samples/sample.csv', slug='csv')
+
+    comparison = compare_prices(parser, min_sources=2)
+
+    assert comparison.sources == ['xls', 'csv']
+    assert list(comparison['sku']) == ['123-ААА', '124-БББ', '125-ВВВ', '126-ГГГ']
+    assert list(comparison['spread']) == [0.0, 0.0, 0.0, 0.0]
+
+
+@pytest.mark.parametrize('data_sources', [PricelistParser(), {}, {'empty': []}])
+def test_compare_prices_empty(data_sources):
+    comparison = compare_prices(data_sources)
+
+    assert len(comparison) == 0
+    assert set(comparison.keys()) == {'sku', 'min', 'max', 'median', 'spread', 'cheapest', 'count'}
+    assert all(len(comparison[key]) == 0 for key in comparison.keys())
+    assert len(comparison.to_pandas()) == 0
@@ -0,0 +1,49 @@
+import pickle
+
+from pricelist_parser import PricelistSnapshot, diff_pricelist, parse_pricelist
+
+
+def read_sample(current_path):
+    with open(current_path + '/samples/sample.csv', 'rb') as file_object:
+        return file_object.read().decode('utf-8')
+
+
+def test_diff_pricelist(current_path):
+    previous = parse_pricelist(current_path + '/samples/sample.csv')
+    content = read_sample(current_path)
+    content = content.replace(',1500,2500,', ',1500,2700,').replace('126-ГГГ', '128-ЕЕЕ')
+
+    changes = list(diff_pricelist(previous, content.encode('utf-8')))
+
+    assert [(change.kind, change.sku) for change in changes] == [
+        ('changed', '124-БББ'),
+        ('added', '128-ЕЕЕ'),
+        ('removed', '126-ГГГ'),
+    ]
+    assert changes[0].old == {'price': 2500.0}
+    assert changes[0].new.price == 2700.0
+    assert changes[1].old is None
+    assert changes[2].new is None
+
+
+def test_diff_pricelist_without_changes(current_path):
+    previous = parse_pricelist(current_path + '/samples/sample.xls')
+
+    assert list(diff_pricelist(previous, current_path + '/samples/sample.xlsx')) == []
+
+
+def test_diff_pricelist_snapshot(current_path):
+    path = current_path + '/samples/sample.csv'
+    snapshot = PricelistSnapshot(fields=('price', 'dimensions'))
+
+    assert len(list(diff_pricelist([], path, fields=('price', 'dimensions'), snapshot=snapshot))) == 4
+
+    # Снимок можно сохранить и сравнить с ним следующую версию файла
+    snapshot = pickle.loads(pickle.dumps(snapshot))
+    content = read_sample(current_path).replace('134x34,,', '135x35,,')
+
+    changes = list(diff_pricelist(snapshot, content.encode('utf-8')))
+
+    assert snapshot.fields == ('price', 'dimensions')
+    assert [(change.kind, change.sku) for change in changes] == [('changed', '123-ААА')]
+    assert changes[0].old == {'price': 3999.99, 'dimensions': '134x34'}
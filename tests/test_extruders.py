@@ -3,6 +3,7 @@ import pytest
 import xlrd
 
 from pricelist_parser import CsvExtruder, Extruder, XlsExtruder, XlsxExtruder, parse_pricelist
+from pricelist_parser.extruders import _normalize_header, normalize_cell_value
 
 
 def flatten_headers(headers):
@@ -35,6 +36,66 @@ def test_detect_header_type(value, expected):
     assert detected_type is expected
 
 
+def test_detect_header_type_first_type_wins():
+    extruder = Extruder()
+
+    # «Цена заказа» подходит и под price, и под order – выигрывает тип, объявленный раньше
+    assert extruder.detect_header_type('Цена заказа') == 'price'
+    assert extruder.detect_header_type('  КОД ТОВАРА ') == 'sku'
+    assert extruder.detect_header_type(None) is None
+    assert extruder.detect_header_type(1500.0) is None
+
+
+def test_detect_header_type_after_signatures_update():
+    extruder = Extruder()
+    assert extruder.detect_header_type('Подношение') is None
+
+    extruder.update_header_signatures({'sku': ['подношение']})
+    assert extruder.detect_header_type('Подношение') == 'sku'
+
+    extruder.update_header_signatures({'sku': ['оброк']}, replace=True)
+    assert extruder.detect_header_type('Подношение') is None
+    assert extruder.detect_header_type('Артикул') is None
+    assert extruder.detect_header_type('Оброк (руб.)') == 'sku'
+
+
+def test_detect_header_type_escapes_signatures():
+    extruder = Extruder()
+    extruder.update_header_signatures({'flavour': ['c++', '(x)']})
+
+    assert extruder.detect_header_type('Язык C++') == 'flavour'
+    assert extruder.detect_header_type('Параметр (x)') == 'flavour'
+    assert extruder.detect_header_type('ccc') is None
+
+
+def test_normalize_cell_value_caches_only_short_strings():
+    _normalize_header.cache_clear()
+    description = 'Сепулька хитровывернутая по оси X ' * 10
+
+    assert normalize_cell_value(' Цена ') == 'цена'
+    assert normalize_cell_value(description) == description.lower().strip()
+    assert normalize_cell_value(1150.6) == '1150.6'
+    assert _normalize_header.cache_info().currsize == 1
+
+
+def test_scan_headers_skips_cache_for_numbers(tmp_path):
+    path = str(tmp_path / 'numbers.xlsx')
+    wb = openpyxl.Workbook()
+    wb.active.append(['Артикул', 'Цена'])
+
+    for idx in range(1, 101):
+        wb.active.append([idx, idx * 1.5])
+
+    wb.save(path)
+    _normalize_header.cache_clear()
+
+    extruder = XlsxExtruder(path, header_probe_rows=None)
+    extruder.load_data()
+
+    assert len(extruder.items) == 100
+    assert _normalize_header.cache_info().currsize == 2
+
+
 def test_detect_headers_random_xls(current_path):
     extruder = XlsExtruder()
     wb = extruder.load_file(current_path + '/samples/sample.xls')
@@ -85,6 +146,78 @@ def test_detect_headers_filled_xlsx(current_path):
     }
 
 
+def test_detect_headers_probe_stops_on_complete_row(current_path):
+    extruder = XlsExtruder()
+    wb = extruder.load_file(current_path + '/samples/sample.xls')
+    ws = extruder.get_worksheet(wb, 'Лист с данными – 2')
+
+    headers = extruder.detect_headers(ws)
+
+    assert [x['row'] for x in headers] == [8]
+
+
+def test_detect_headers_full_scan(current_path):
+    extruder = XlsExtruder(header_probe_rows=None)
+    wb = extruder.load_file(current_path + '/samples/sample.xls')
+    ws = extruder.get_worksheet(wb, 'Лист с данными – 2')
+
+    headers = extruder.detect_headers(ws)
+
+    assert len(headers) > 1
+    assert extruder.select_best_headers(headers)['row'] == 8
+
+
+def test_detect_headers_probe_reads_only_window(current_path):
+    class CountingXlsExtruder(XlsExtruder):
+        max_row_read = 0
+
+        def iter_rows(self, ws, start_row=1, stop_row=None, columns=None):
+            for row_idx, row in super().iter_rows(ws, start_row=start_row, stop_row=stop_row, columns=columns):
+                self.max_row_read = max(self.max_row_read, row_idx)
+                yield row_idx, row
+
+    extruder = CountingXlsExtruder()
+    wb = extruder.load_file(current_path + '/samples/sample.xls')
+    ws = extruder.get_worksheet(wb, 'Лист с данными – 2')
+
+    extruder.detect_headers(ws)
+
+    assert extruder.max_row_read == 8
+
+
+def test_detect_headers_probe_falls_back_to_full_scan(current_path):
+    extruder = XlsExtruder(header_probe_rows=3)
+    wb = extruder.load_file(current_path + '/samples/sample.xls')
+    ws = extruder.get_worksheet(wb, 'Лист с данными – 2')
+
+    headers = extruder.detect_headers(ws)
+
+    assert headers[0]['row'] == 8
+    assert extruder.select_best_headers(headers)['row'] == 8
+
+
+def test_select_best_headers_prefers_required(extruder):
+    headers = extruder.select_best_headers([
+        {
+            'row': 3,
+            'headers': [
+                {'column': 1, 'name': 'Код', 'type': 'sku'},
+                {'column': 2, 'name': 'Цена', 'type': 'price'},
+            ],
+        },
+        {
+            'row': 9,
+            'headers': [
+                {'column': 1, 'name': 'Код товара', 'type': 'sku'},
+                {'column': 2, 'name': 'Описание', 'type': 'description'},
+                {'column': 3, 'name': 'Вес', 'type': 'weight'},
+            ],
+        },
+    ])
+
+    assert headers['row'] == 3
+
+
 def test_headers_map_filled_xlsx(current_path):
     extruder = XlsxExtruder(current_path + '/samples/sample.xlsx')
     extruder.load_data()
@@ -139,6 +272,25 @@ def test_extract_data_from_sheet_xls(current_path):
     assert items[8].price == 1150.6
 
 
+def test_iter_items_xls(current_path):
+    extruder = XlsExtruder(current_path + '/samples/sample.xls')
+
+    items = extruder.iter_items()
+
+    assert next(items).sku == '123-ААА'
+    assert extruder.items == []
+    assert 1 + sum(1 for _ in items) == 679
+
+
+def test_load_data_accumulates_items(current_path):
+    extruder = XlsExtruder(current_path + '/samples/sample.xls')
+
+    extruder.load_data()
+
+    assert len(extruder.items) == 679
+    assert extruder.items[0].sku == '123-ААА'
+
+
 def test_select_best_headers_single(single_header_definition):
     extruder = Extruder()
 
@@ -207,6 +359,39 @@ def test_xlsx_load_file(current_path):
     assert type(wb) is openpyxl.workbook.workbook.Workbook
 
 
+def test_xlsx_load_file_read_only(current_path):
+    extruder = XlsxExtruder()
+    wb = extruder.load_file(current_path + '/samples/sample.xlsx', read_only=True)
+
+    assert type(wb) is openpyxl.workbook.workbook.Workbook
+    assert wb.read_only is True
+
+
+def test_xlsx_iter_rows_read_only(current_path):
+    extruder = XlsxExtruder()
+    wb = extruder.load_file(current_path + '/samples/sample.xlsx', read_only=True)
+    ws = extruder.get_worksheet(wb, 'Лист с заголовком')
+
+    rows = list(extruder.iter_rows(ws, start_row=2, stop_row=3))
+
+    assert [row_idx for row_idx, row in rows] == [2, 3]
+    assert rows[0][1][1] == 'B2'
+    assert rows[1][1][2] == 'C3'
+
+
+def test_extract_data_from_sheet_xlsx_read_only(current_path):
+    extruder = XlsxExtruder(current_path + '/samples/sample.xlsx')
+    wb = extruder.load_file(current_path + '/samples/sample.xlsx', read_only=True)
+
+    headers_map = extruder.get_headers_map(wb)
+    items = extruder.extract_data_from_sheet(headers_map[0])
+
+    assert len(headers_map) == 2
+    assert len(items) == 9
+    assert items[0].sku == '123-ААА'
+    assert items[8].price == 1150.6
+
+
 def test_xlsx_get_worksheet_names(current_path):
     extruder = XlsxExtruder()
     wb = extruder.load_file(current_path + '/samples/sample.xlsx')
@@ -301,6 +486,173 @@ def test_csv_get_cell(sample_csv_ws):
     assert extruder.get_cell(ws, 4, 1) == 'Размеры'
 
 
+@pytest.mark.parametrize('extruder_class, sample, worksheet_name', [
+    [XlsExtruder, 'sample.xls', 'Лист с данными'],
+    [XlsxExtruder, 'sample.xlsx', 'Лист с данными'],
+    [CsvExtruder, 'sample.csv', 'default'],
+])
+def test_row_access_matches_get_cell(current_path, extruder_class, sample, worksheet_name):
+    extruder = extruder_class()
+    wb = extruder.load_file(current_path + '/samples/' + sample)
+    ws = extruder.get_worksheet(wb, worksheet_name)
+    cols_num = extruder.get_cols_num(ws)
+
+    for row_idx, row in extruder.iter_rows(ws):
+        expected = [extruder.get_cell(ws, col_idx, row_idx) for col_idx in range(1, cols_num + 1)]
+
+        assert list(row) == expected
+        assert list(extruder.get_row(ws, row_idx)) == expected
+
+
+@pytest.mark.parametrize('extruder_class, sample, worksheet_name', [
+    [XlsExtruder, 'sample.xls', 'Лист с данными'],
+    [XlsxExtruder, 'sample.xlsx', 'Лист с данными'],
+    [CsvExtruder, 'sample.csv', 'default'],
+])
+def test_iter_rows_selected_columns(current_path, extruder_class, sample, worksheet_name):
+    extruder = extruder_class()
+    wb = extruder.load_file(current_path + '/samples/' + sample)
+    ws = extruder.get_worksheet(wb, worksheet_name)
+
+    rows = list(extruder.iter_rows(ws, start_row=2, stop_row=4, columns=[3, 1, 20]))
+
+    assert [row_idx for row_idx, row in rows] == [2, 3, 4]
+
+    for row_idx, row in rows:
+        assert row == [extruder.get_cell(ws, 3, row_idx), extruder.get_cell(ws, 1, row_idx), None]
+
+
+def test_csv_get_cell_ragged_row(tmp_path):
+    source_file = tmp_path / 'ragged.csv'
+    source_file.write_text('Артикул,Цена,Описание\n123,100\n', encoding='utf-8')
+
+    extruder = CsvExtruder()
+    ws = extruder.get_worksheet(extruder.load_file(str(source_file)))
+
+    assert extruder.get_cell(ws, 2, 2) == '100'
+    assert extruder.get_cell(ws, 3, 2) is None
+    assert extruder.get_cell(ws, 1, 5) is None
+
+
+def test_csv_ragged_rows_extraction(tmp_path):
+    source_file = tmp_path / 'ragged.csv'
+    source_file.write_text('Описание,Цена,Артикул\nБез артикула,100\nС артикулом,200,123\n', encoding='utf-8')
+
+    extruder = CsvExtruder(str(source_file)).load_data()
+
+    assert len(extruder.items) == 1
+    assert extruder.items[0].sku == '123'
+
+
+@pytest.fixture()
+def long_csv_file(tmp_path):
+    source_file = tmp_path / 'long.csv'
+
+    with open(source_file, 'w', encoding='utf-8') as file_object:
+        file_object.write('Прайс-лист\n\nАртикул,Цена\n')
+
+        for idx in range(1, 501):
+            file_object.write(f'SKU-{idx},{idx}.5\n')
+
+    return str(source_file)
+
+
+def test_csv_load_file_keeps_only_head(long_csv_file):
+    extruder = CsvExtruder()
+    extruder.head_rows = 10
+    ws = extruder.get_worksheet(extruder.load_file(long_csv_file))
+
+    assert len(ws.data) == 10
+    assert ws.is_fully_loaded is False
+    assert extruder.get_rows_num(ws) == 503
+    assert extruder.get_cell(ws, 1, 503) == 'SKU-500'
+
+
+def test_csv_streaming_extraction(long_csv_file):
+    extruder = CsvExtruder(long_csv_file)
+    extruder.head_rows = 10
+
+    items = list(extruder.iter_items())
+
+    assert len(extruder.data) == 10
+    assert len(items) == 500
+    assert items[0].sku == 'SKU-1'
+    assert items[-1].sku == 'SKU-500'
+    assert items[-1].price == 500.5
+
+
+@pytest.fixture()
+def table_with_footer_csv(tmp_path):
+    # Пустая строка между разделами, а после таблицы – подвал с реквизитами, похожими на товар
+    source_file = tmp_path / 'footer.csv'
+    source_file.write_text(
+        'Артикул,Цена\nA-1,100\n,\nРаздел 2,\nA-2,200\n,\n,\n,\nИНН 7700000000,1 000 руб.\n',
+        encoding='utf-8',
+    )
+
+    return str(source_file)
+
+
+def test_max_empty_rows(table_with_footer_csv):
+    assert len(parse_pricelist(table_with_footer_csv)) == 3
+
+    items = parse_pricelist(table_with_footer_csv, max_empty_rows=2)
+
+    assert [item.sku for item in items] == ['A-1', 'A-2']
+
+
+def test_max_empty_rows_streaming(long_csv_file):
+    extruder = CsvExtruder(long_csv_file, max_empty_rows=2)
+    extruder.head_rows = 10
+
+    assert len(list(extruder.iter_items())) == 500
+
+
+def test_used_rows_num(tmp_path):
+    # Оформление пустых ячеек далеко за таблицей раздувает размер листа
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    ws.append(['Артикул', 'Цена', 'Примечание'])
+    ws.append(['A-1', 100])
+    ws.append(['A-2', 200])
+    ws['C10'] = 'Цены действительны до конца месяца'
+    ws['B100000'].fill = openpyxl.styles.PatternFill('solid', fgColor='FFFF00')
+    ws['XFD1'].fill = openpyxl.styles.PatternFill('solid', fgColor='FFFF00')
+    path = str(tmp_path / 'inflated.xlsx')
+    wb.save(path)
+
+    extruder = XlsxExtruder(path)
+    ws = extruder.get_worksheet(extruder.load_file(path), 'Sheet')
+
+    assert extruder.get_rows_num(ws) == 100000
+    assert extruder.get_used_rows_num(ws) == 10
+    assert extruder.get_used_rows_num(ws, columns=[1, 2]) == 3
+    assert extruder.get_used_columns(ws) == [1, 2, 3]
+
+    extruder = XlsxExtruder(path)
+    items = list(extruder.iter_items())
+
+    assert len(items) == 2
+    assert extruder.stats.counters['rows_scanned'] < 100
+    assert extruder.stats.counters['cells_read'] < 1000
+    # Столбец «Примечание» тоже попал в заголовки, поэтому таблица заканчивается на строке 10
+    assert extruder.stats.counters['rows_trimmed'] == 100000 - 10
+
+    # Лист, который читается потоком, с конца не просмотреть
+    extruder = XlsxExtruder(path)
+    ws = extruder.get_worksheet(extruder.load_file(path, read_only=True), 'Sheet')
+
+    assert extruder.get_used_rows_num(ws) is None
+
+
+def test_used_rows_num_xls(sample_xls_ws):
+    extruder = XlsExtruder()
+    ws = sample_xls_ws('Лист с данными')
+
+    assert extruder.get_used_rows_num(ws) == extruder.get_rows_num(ws)
+    assert extruder.get_used_rows_num(ws, columns=[100]) == 0
+
+
 def test_wrong_encoding_exception_in_csv(current_path):
     extruder = CsvExtruder()
 
@@ -325,6 +677,61 @@ def test_set_encoding_in_parse_pricelist_function(current_path):
     assert True
 
 
+def test_detect_encoding_and_delimiter_in_csv(current_path):
+    extruder = CsvExtruder()
+    extruder.load_file(current_path + '/samples/cp154_encoded.csv', encoding='auto', delimiter='auto')
+
+    assert extruder.encoding == 'cp1251'
+    assert extruder.dialect['delimiter'] == ';'
+    assert extruder.data[1][2] == 'Артикул'
+    assert len(parse_pricelist(current_path + '/samples/cp154_encoded.csv', encoding='auto', delimiter='auto')) == 375
+    assert len(parse_pricelist(current_path + '/samples/cp154_encoded.csv', encoding='cp154', delimiter=';')) == 375
+
+
+@pytest.mark.parametrize('content, encoding, delimiter', [
+    ['Артикул\tЦена\n123\t"1 000,50"\n124\t200\n', 'koi8_r', '\t'],
+    ["Артикул|Цена|Описание\n123|100|'Сепулька | обычная'\n124|200|\n", 'utf-8-sig', '|'],
+    ['Артикул,Цена\n123,"1,000.50"\n124,200\n', 'cp866', ','],
+])
+def test_sniff_csv_dialect(tmp_path, content, encoding, delimiter):
+    source_file = tmp_path / 'pricelist.csv'
+    source_file.write_bytes(content.encode(encoding))
+
+    extruder = CsvExtruder()
+    extruder.load_file(str(source_file), encoding='auto', delimiter='auto')
+    items = parse_pricelist(str(source_file), encoding='auto', delimiter='auto')
+
+    assert extruder.encoding == encoding
+    assert extruder.dialect['delimiter'] == delimiter
+    assert [item.sku for item in items] == ['123', '124']
+
+
+def test_sniff_csv_sample_size(tmp_path):
+    # Разделитель определяется по началу файла, остальное читается потоком
+    source_file = tmp_path / 'pricelist.csv'
+    source_file.write_text('Артикул;Цена\n' + ''.join(f'SKU-{idx};{idx}\n' for idx in range(1, 20001)), encoding='cp1251')
+
+    extruder = CsvExtruder(str(source_file))
+    extruder.sniff_size = 1024
+    extruder.load_data(encoding='auto', delimiter='auto')
+
+    assert extruder.encoding == 'cp1251'
+    assert extruder.dialect['delimiter'] == ';'
+    assert len(extruder.items) == 20000
+
+
+def test_sniff_csv_keeps_doublequote(tmp_path):
+    # В образце нет экранированных кавычек, они встречаются только дальше в файле
+    source_file = tmp_path / 'pricelist.csv'
+    rows = ''.join(f'SKU-{idx};"Сепулька {idx}";{idx}\n' for idx in range(1, 3001))
+    source_file.write_text('Артикул;Наименование;Цена\n' + rows + 'B1;"Монитор 27"" дюймов";100\n', encoding='utf-8')
+
+    items = parse_pricelist(str(source_file), delimiter='auto')
+
+    assert len(items) == 3001
+    assert items[-1].name == 'Монитор 27" дюймов'
+
+
 def test_default_header_signature_list(extruder):
     assert set(extruder.header_signatures.keys()) == {'sku', 'price', 'quantity', 'name', 'description', 'dimensions', 'weight', 'link', 'vat', 'order'}
 
@@ -362,8 +769,10 @@ def test_insert_header_signature(extruder):
 def test_header_signatures_not_propagated():
     extruder_1 = Extruder()
     extruder_1.update_header_signatures({'flavour': ['lepton', 'baryon', 'strangeness', 'charm', 'bottom', 'topness']})
+    extruder_1.update_header_signatures({'sku': ['оброк']})
 
     extruder_2 = Extruder()
 
     assert 'flavour' in extruder_1.header_signatures.keys()
     assert 'flavour' not in extruder_2.header_signatures.keys()
+    assert 'оброк' not in extruder_2.header_signatures['sku']
@@ -0,0 +1,63 @@
+import pytest
+
+from pricelist_parser import PricelistParser, PricelistParserItem, SkuIndex
+
+
+@pytest.fixture()
+def duplicated_items():
+    return [
+        PricelistParserItem(sku='A-1', price=300),
+        PricelistParserItem(sku='A-1', price=100),
+        PricelistParserItem(sku='A-1', price=200),
+    ]
+
+
+@pytest.mark.parametrize('duplicates, expected', [
+    ['first', 300.0],
+    ['last', 200.0],
+    ['min_price', 100.0],
+])
+def test_index_duplicates(duplicated_items, duplicates, expected):
+    index = SkuIndex(duplicates=duplicates)
+    index.add('supplier', duplicated_items)
+
+    assert index['A-1']['supplier'].price == expected
+
+
+def test_index_duplicates_all(duplicated_items):
+    index = SkuIndex(duplicates='all')
+    index.add('supplier', duplicated_items)
+
+    assert [item.price for item in index['A-1']['supplier']] == [300.0, 100.0, 200.0]
+
+
+def test_index_unsupported_duplicates():
+    with pytest.raises(ValueError):
+        SkuIndex(duplicates='random')
+
+
+def test_index_normalization():
+    index = SkuIndex(ignore_case=True, ignore_whitespace=True, ignore_leading_zeros=True)
+    index.add('supplier', [PricelistParserItem(sku='00 ab-12', price=1), PricelistParserItem(sku='000', price=2)])
+
+    assert index.get('AB-12')['supplier'].sku == '00 ab-12'
+    assert index.get('0')['supplier'].price == 2.0
+    assert ' Ab - 12' in index
+    assert 'ab12' not in index
+    assert SkuIndex().get('ab-12') is None
+
+
+def test_parser_index(current_path):
+    parser = PricelistParser(index=SkuIndex())
+
+    parser.add_data_source(source_file=current_path + '/samples/sample.xls', slug='xls')
+    parser.add_data_sources([{'source_file': current_path + '/samples/sample.csv', 'slug': 'csv'}], workers=1)
+
+    assert len(parser.index) == 679
+    assert sorted(parser.index['126-ГГГ'].keys()) == ['csv', 'xls']
+    assert parser.index['126-ГГГ']['csv'].price == 1990.0
+
+    # Повторная загрузка источника заменяет его товары
+    parser.add_data_source(source_file=current_path + '/samples/sample.csv', slug='xls')
+
+    assert len(parser.index) == 4
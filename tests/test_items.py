@@ -1,18 +1,23 @@
+import pickle
 import pytest
+from price_parser import Price
 
 from pricelist_parser import PricelistParserItem
+from pricelist_parser.extruders import header_signatures
+from pricelist_parser.pricelist_item import parse_price
 
 
-@pytest.mark.parametrize('sku, price, expected', [
-    ['1123-ABC', 1233.1, True],
-    ['', 1233.1, False],
-    ['1123-ABC', None, False],
-    [None, None, False],
+@pytest.mark.parametrize('sku, price, expected, error', [
+    ['1123-ABC', 1233.1, True, None],
+    ['', 1233.1, False, 'missing_sku'],
+    ['1123-ABC', None, False, 'missing_price'],
+    [None, None, False, 'missing_price'],
 ])
-def test_item_validate(sku, price, expected):
+def test_item_validate(sku, price, expected, error):
     item = PricelistParserItem(sku=sku, price=price)
 
     assert item.is_valid() is expected
+    assert item.validation_error() == error
 
 
 def test_arbitrary_attrs_passing():
@@ -28,3 +33,47 @@ def test_asdict():
     item = PricelistParserItem(sku='12-ппп', price=1234, randomattr='Я абсолютно случаен', anotherrandomattr=777)
 
     assert dict(item) == {'sku': '12-ппп', 'price': 1234, 'randomattr': 'Я абсолютно случаен', 'anotherrandomattr': 777}
+
+
+def test_known_header_types_are_slots():
+    assert set(header_signatures.keys()) <= set(PricelistParserItem.__slots__)
+
+
+def test_item_has_no_instance_dict():
+    item = PricelistParserItem(sku='12-ппп', price=1234, name='Сепулька')
+
+    assert not hasattr(item, '__dict__')
+    assert item._extra is None
+
+
+def test_missing_attrs_and_keys():
+    item = PricelistParserItem(sku='12-ппп', price=1234, randomattr='Я абсолютно случаен')
+
+    assert item.name is None
+    assert item.unknownattr is None
+    assert list(item.keys()) == ['sku', 'price', 'randomattr']
+    assert item['randomattr'] == 'Я абсолютно случаен'
+    assert item.data == {'sku': '12-ппп', 'price': 1234, 'randomattr': 'Я абсолютно случаен'}
+
+    with pytest.raises(KeyError):
+        item['name']
+
+    with pytest.raises(KeyError):
+        item['unknownattr']
+
+
+def test_item_pickling():
+    item = PricelistParserItem(sku='12-ппп', price=1234, quantity=5, randomattr='Я абсолютно случаен')
+
+    restored = pickle.loads(pickle.dumps(item))
+
+    assert dict(restored) == dict(item)
+    assert restored.name is None
+
+
+@pytest.mark.parametrize('value', [
+    0, 0.0, -0.0, 1402, 1402.0, 3999.99, 0.125, 1.153, 1234.567, 1.1534, -5.5, 1e-05, 1e+16, 10 ** 20,
+    float('nan'), float('inf'), True, None, '', '1 200,00 руб.', '2,999.99', '850,85', 'по запросу',
+])
+def test_parse_price_matches_price_parser(value):
+    assert parse_price(value) == Price.fromstring(str(value)).amount_float
@@ -0,0 +1,92 @@
+import pytest
+
+from pricelist_parser import Extruder, LayoutStore, PricelistParser, parse_pricelist
+
+
+@pytest.mark.parametrize('sample', ['sample.xls', 'sample.xlsx', 'sample.csv'])
+def test_layout_skips_header_detection(current_path, sample, monkeypatch):
+    layouts = LayoutStore()
+    path = current_path + '/samples/' + sample
+
+    parsed = PricelistParser(layouts=layouts).add_data_source(source_file=path, slug='supplier')
+
+    assert layouts.get('supplier') == parsed.layout
+
+    def fail(*args, **kwargs):
+        raise AssertionError()
+
+    monkeypatch.setattr(Extruder, 'detect_headers', fail)
+
+    repeated = PricelistParser(layouts=layouts).add_data_source(source_file=path, slug='supplier')
+
+    assert [dict(item) for item in repeated.items] == [dict(item) for item in parsed.items]
+
+
+def test_layout_falls_back_to_detection(current_path):
+    layouts = LayoutStore()
+    parser = PricelistParser(layouts=layouts)
+
+    xls_layout = parser.add_data_source(source_file=current_path + '/samples/sample.xls', slug='supplier').layout
+
+    # Поставщик прислал файл с другой раскладкой
+    extruder = parser.add_data_source(source_file=current_path + '/samples/sample.csv', slug='supplier')
+
+    assert len(extruder.items) == 4
+    assert layouts.get('supplier') != xls_layout
+
+    # Заголовки сдвинулись на другую строку
+    shifted_layout = dict(xls_layout, sheets=[dict(sheet, row=sheet['row'] + 1) for sheet in xls_layout['sheets']])
+    items = parse_pricelist(current_path + '/samples/sample.xls', layout=shifted_layout)
+
+    assert len(items) == 679
+
+
+def test_layout_depends_on_signatures(current_path):
+    layouts = LayoutStore()
+    path = current_path + '/samples/sample.xls'
+
+    layout = PricelistParser(layouts=layouts).add_data_source(source_file=path, slug='supplier').layout
+    extruder = PricelistParser(layouts=layouts).add_data_source(source_file=path, slug='supplier', header_signatures={'sku': ['шифр']})
+
+    assert len(extruder.items) == 679
+    assert extruder.layout['signatures'] != layout['signatures']
+    assert layouts.get('supplier') == extruder.layout
+
+
+def test_layout_store_persistence(current_path, tmp_path):
+    path = str(tmp_path / 'layouts.json')
+
+    PricelistParser(layouts=LayoutStore(path)).add_data_sources([
+        {'source_file': current_path + '/samples/sample.xls', 'slug': 'xls'},
+        {'source_file': current_path + '/samples/sample.csv', 'slug': 'csv'},
+    ], workers=2)
+
+    layouts = LayoutStore(path)
+
+    assert sorted(layouts.layouts.keys()) == ['csv', 'xls']
+    assert [sheet['row'] for sheet in layouts.get('xls')['sheets']] == [4, 8]
+
+
+@pytest.mark.parametrize('sheet_executor', ['thread', 'process'])
+def test_layout_sheet_workers(current_path, sheet_executor):
+    layouts = LayoutStore()
+    path = current_path + '/samples/sample.xls'
+    expected = PricelistParser().add_data_source(source_file=path, slug='supplier')
+
+    parsed = PricelistParser(layouts=layouts).add_data_source(source_file=path, slug='supplier', sheet_workers=2, sheet_executor=sheet_executor)
+
+    assert layouts.get('supplier') == expected.layout
+
+    repeated = PricelistParser(layouts=layouts).add_data_source(source_file=path, slug='supplier', sheet_workers=2, sheet_executor=sheet_executor)
+
+    assert 'apply_layout' in repeated.stats.timings
+    assert 'detect_headers' not in repeated.stats.timings
+    assert [dict(item) for item in repeated.items] == [dict(item) for item in parsed.items] == [dict(item) for item in expected.items]
+
+    # Заголовки сдвинулись на другую строку – ищем их заново и запоминаем новую раскладку
+    shifted = dict(expected.layout, sheets=[dict(sheet, row=sheet['row'] + 1) for sheet in expected.layout['sheets']])
+    layouts.set('supplier', shifted)
+    extruder = PricelistParser(layouts=layouts).add_data_source(source_file=path, slug='supplier', sheet_workers=2, sheet_executor=sheet_executor)
+
+    assert len(extruder.items) == 679
+    assert layouts.get('supplier') == expected.layout
@@ -1,6 +1,15 @@
+import io
+import mmap
+import os
 import pytest
+import shutil
+import types
+from concurrent.futures.process import BrokenProcessPool
 
-from pricelist_parser import parse_pricelist
+from pricelist_parser import XlsExtruder, XlsxExtruder, iter_pricelist, parse_pricelist
+from pricelist_parser import parser as parser_module
+from pricelist_parser.extruders import extract_sheets_items
+from pricelist_parser.parser import load_data_source
 
 
 @pytest.mark.parametrize('path, expected', [
@@ -39,6 +48,14 @@ def test_parse_pricelist_xlsx(current_path, parser):
     assert len(parser.data_sources['sample'].items) == 679
 
 
+def test_parse_pricelist_xlsx_read_only(current_path, parser):
+    extruder = parser.add_data_source(source_file=current_path + '/samples/sample.xlsx', slug='sample', read_only=True)
+
+    assert len(extruder.items) == 679
+    assert extruder.loaded_file.read_only is True
+    assert [dict(item) for item in extruder.items] == [dict(item) for item in parse_pricelist(current_path + '/samples/sample.xlsx')]
+
+
 def test_parse_pricelist_csv(current_path, parser):
     parser.add_data_source(source_file=current_path + '/samples/sample.csv', slug='sample')
 
@@ -60,6 +77,33 @@ def test_parse_pricelist_function(current_path):
     assert len(items) == 679
 
 
+def test_iter_pricelist_function(current_path):
+    items = iter_pricelist(current_path + '/samples/sample.xls')
+
+    assert isinstance(items, types.GeneratorType)
+
+    first_item = next(items)
+
+    assert first_item.sku == '123-ААА'
+    assert first_item.price == 3999.99
+    assert 1 + sum(1 for _ in items) == 679
+
+
+def test_iter_pricelist_unsupported_file_type(current_path):
+    with pytest.raises(ValueError):
+        iter_pricelist(current_path + '/samples/sample.doc')
+
+
+def test_iter_pricelist_without_data(current_path, tmp_path):
+    source_file = tmp_path / 'empty.csv'
+    source_file.write_text('Просто,какой-то,текст\n1,2,3\n', encoding='utf-8')
+
+    items = iter_pricelist(str(source_file))
+
+    with pytest.raises(ValueError):
+        next(items)
+
+
 def test_passing_all_extruded_values(current_path):
     items = parse_pricelist(current_path + '/samples/sample.xls')
 
@@ -88,3 +132,190 @@ def test_replace_header_signatures_in_parse_pricelist_function(current_path):
     items = parse_pricelist(current_path + '/samples/sample.xls', header_signatures={'sku': ['заголовок']})
 
     assert items[0].sku == 'Здесь нужно что-то написать'
+
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_add_data_sources(current_path, parser, workers):
+    loaded = parser.add_data_sources([
+        current_path + '/samples/sample.xls',
+        {'source_file': current_path + '/samples/sample.xlsx', 'slug': 'xlsx', 'read_only': True},
+        {'source_file': current_path + '/samples/sample.xls', 'slug': 'titles', 'header_signatures': {'sku': ['заголовок']}, 'replace_header_signatures': True},
+    ], workers=workers)
+
+    assert list(loaded.keys()) == ['sample', 'xlsx', 'titles']
+    assert parser.errors == {}
+    assert len(parser.data_sources['sample'].items) == 679
+    assert len(parser.data_sources['xlsx'].items) == 679
+    assert parser.data_sources['titles'].items[0].sku == 'Здесь нужно что-то написать'
+
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_add_data_sources_reports_errors(current_path, parser, workers):
+    loaded = parser.add_data_sources([
+        {'source_file': current_path + '/samples/sample.doc', 'slug': 'doc'},
+        current_path + '/samples/missing.xls',
+        current_path + '/samples/sample.csv',
+    ], workers=workers)
+
+    assert list(loaded.keys()) == ['sample']
+    assert len(parser.data_sources['sample'].items) == 4
+    assert set(parser.errors.keys()) == {'doc', 'missing'}
+    assert isinstance(parser.errors['doc'], ValueError)
+    assert isinstance(parser.errors['missing'], FileNotFoundError)
+
+
+def crash_on_bad_source(options, cache=None):
+    if options['slug'] == 'bad':
+        os._exit(1)
+
+    return load_data_source(options, cache)
+
+
+def test_add_data_sources_survives_worker_crash(current_path, parser, monkeypatch):
+    # Упавший процесс ломает весь пул, но ошибку получает только файл, из-за которого он упал
+    monkeypatch.setattr(parser_module, 'load_data_source', crash_on_bad_source)
+
+    loaded = parser.add_data_sources([
+        {'source_file': current_path + '/samples/sample.csv', 'slug': 'bad'},
+        {'source_file': current_path + '/samples/sample.xls', 'slug': 'xls'},
+        {'source_file': current_path + '/samples/sample.xlsx', 'slug': 'xlsx'},
+    ], workers=2)
+
+    assert list(loaded.keys()) == ['xls', 'xlsx']
+    assert list(parser.errors.keys()) == ['bad']
+    assert isinstance(parser.errors['bad'], BrokenProcessPool)
+
+
+@pytest.mark.parametrize('sample', ['sample.xls', 'sample.xlsx'])
+@pytest.mark.parametrize('sheet_executor', ['thread', 'process'])
+def test_parse_pricelist_concurrent_sheets(current_path, sample, sheet_executor):
+    expected = [dict(item) for item in parse_pricelist(current_path + '/samples/' + sample)]
+
+    items = parse_pricelist(current_path + '/samples/' + sample, sheet_workers=3, sheet_executor=sheet_executor)
+
+    assert [dict(item) for item in items] == expected
+
+
+@pytest.mark.parametrize('extruder_class, sample, options, option, expected', [
+    [XlsExtruder, 'sample.xls', {}, 'on_demand', True],
+    [XlsxExtruder, 'sample.xlsx', {}, 'read_only', None],
+    [XlsxExtruder, 'sample.xlsx', {'read_only': True}, 'read_only', True],
+])
+def test_sheet_worker_opens_file_once(current_path, monkeypatch, extruder_class, sample, options, option, expected):
+    # Процесс открывает файл один раз на всю пачку листов. XLS загружает только нужные листы,
+    # а XLSX открывает с теми же параметрами, что и вызывающий
+    loads = []
+    load_file = extruder_class.load_file
+
+    def counting_load_file(self, filename, **kwargs):
+        loads.append(kwargs.get(option))
+        return load_file(self, filename, **kwargs)
+
+    monkeypatch.setattr(extruder_class, 'load_file', counting_load_file)
+    path = current_path + '/samples/' + sample
+    sheet_names = extruder_class(path).get_source_worksheet_names()
+    loads.clear()
+
+    results, stats, exceeded = extract_sheets_items((extruder_class, path, extruder_class().header_signatures, [(sheet_name, None) for sheet_name in sheet_names], options))
+
+    assert loads == [expected]
+    assert list(results.keys()) == sheet_names
+    assert sum(len(items) for sheet_info, items, layout_matched in results.values() if items is not None) == 679
+
+
+@pytest.mark.parametrize('options', [{'header_probe_rows': None}, {'max_empty_rows': 1}])
+def test_sheet_workers_keep_settings(current_path, options):
+    path = current_path + '/samples/sample.xls'
+    expected = XlsExtruder(path, **options).load_data()
+    extruder = XlsExtruder(path, sheet_workers=2, **options).load_data()
+
+    assert len(extruder.items) == len(expected.items)
+    assert extruder.stats.counters['rows_scanned'] == expected.stats.counters['rows_scanned']
+
+
+def test_concurrent_sheets_keep_header_signatures(current_path, parser):
+    extruder = parser.add_data_source(current_path + '/samples/sample.xls', header_signatures={'sku': ['заголовок']}, replace_header_signatures=True, sheet_workers=2)
+
+    assert extruder.items[0].sku == 'Здесь нужно что-то написать'
+
+
+def test_concurrent_sheets_unsupported_executor(current_path):
+    with pytest.raises(ValueError):
+        parse_pricelist(current_path + '/samples/sample.xls', sheet_workers=2, sheet_executor='fiber')
+
+
+@pytest.mark.parametrize('sample, expected', [
+    ['sample.xls', 679],
+    ['sample.xlsx', 679],
+    ['sample.csv', 4],
+])
+def test_parse_pricelist_from_memory(current_path, sample, expected):
+    with open(current_path + '/samples/' + sample, 'rb') as file_object:
+        content = file_object.read()
+
+    assert len(parse_pricelist(content)) == expected
+    assert len(parse_pricelist(io.BytesIO(content))) == expected
+    assert len(parse_pricelist(bytearray(content), read_only=True)) == expected
+
+
+@pytest.mark.parametrize('sample, expected', [
+    ['sample.xls', 679],
+    ['sample.xlsx', 679],
+    ['sample.csv', 4],
+])
+def test_parse_pricelist_from_file_object(current_path, parser, sample, expected):
+    with open(current_path + '/samples/' + sample, 'rb') as file_object:
+        extruder = parser.add_data_source(file_object, sheet_workers=2)
+
+        assert file_object.closed is False
+
+    assert len(extruder.items) == expected
+    assert parser.data_sources['sample'] is extruder
+
+
+@pytest.mark.parametrize('sample, expected', [
+    ['sample.xls', 679],
+    ['sample.xlsx', 679],
+    ['sample.csv', 4],
+])
+def test_parse_pricelist_with_mmap(current_path, sample, expected):
+    assert len(parse_pricelist(current_path + '/samples/' + sample, use_mmap=True)) == expected
+    assert len(parse_pricelist(current_path + '/samples/' + sample, use_mmap=True, read_only=True)) == expected
+
+    with open(current_path + '/samples/' + sample, 'rb') as file_object:
+        mapped = mmap.mmap(file_object.fileno(), 0, access=mmap.ACCESS_READ)
+
+    assert len(parse_pricelist(mapped)) == expected
+    assert mapped.closed is False
+
+    mapped.close()
+
+
+@pytest.mark.parametrize('sample, wrong_name', [
+    ['sample.xls', 'sample.csv'],
+    ['sample.xlsx', 'sample.xls'],
+    ['sample.csv', 'sample.xlsx'],
+])
+def test_parse_pricelist_mislabeled_extension(current_path, tmp_path, sample, wrong_name):
+    shutil.copy(current_path + '/samples/' + sample, tmp_path / wrong_name)
+
+    items = parse_pricelist(str(tmp_path / wrong_name))
+
+    assert [dict(item) for item in items] == [dict(item) for item in parse_pricelist(current_path + '/samples/' + sample)]
+
+
+def test_parse_pricelist_not_a_workbook(current_path):
+    with pytest.raises(ValueError):
+        parse_pricelist(current_path + '/samples/sample.docx')
+
+
+def test_add_data_source_from_memory_requires_slug(current_path, parser):
+    with open(current_path + '/samples/sample.csv', 'rb') as file_object:
+        content = file_object.read()
+
+    with pytest.raises(ValueError):
+        parser.add_data_source(content)
+
+    parser.add_data_source(content, slug='uploaded')
+
+    assert len(parser.data_sources['uploaded'].items) == 4
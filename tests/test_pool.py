@@ -0,0 +1,70 @@
+from pricelist_parser import ParseStats, PricelistCache, PricelistParser, ValuePool, parse_pricelist
+
+
+def test_value_pool_intern():
+    pool = ValuePool()
+    first = ''.join(['в ', 'наличии'])
+    second = ''.join(['в ', 'наличии'])
+
+    assert first is not second
+    assert pool.intern(first) is first
+    assert pool.intern(second) is first
+    assert pool.intern(10.5) == 10.5
+    assert pool.intern(None) is None
+
+    assert len(pool) == 1
+    assert pool.to_dict() == {'size': 1, 'hits': 1, 'misses': 1, 'hit_rate': 0.5}
+
+    pool.clear()
+
+    assert len(pool) == 0
+    assert pool.hit_rate == 0.0
+
+
+def test_intern_values(current_path):
+    stats = ParseStats()
+    items = parse_pricelist(current_path + '/samples/sample.xlsx', intern_values=True, stats=stats)
+
+    assert [item.data for item in items] == [item.data for item in parse_pricelist(current_path + '/samples/sample.xlsx')]
+    assert stats.counters['pool_hits'] > 0
+    assert stats.counters['pool_hits'] + stats.counters['pool_misses'] > 0
+
+    names = {}
+
+    for item in items:
+        if isinstance(item.name, str):
+            assert names.setdefault(item.name, item.name) is item.name
+
+
+def test_intern_values_skips_sku_and_price(tmp_path):
+    path = tmp_path / 'pricelist.csv'
+    path.write_text('Артикул,Цена,Наличие\nA-1,100,в наличии\nA-1,100,в наличии\n', encoding='utf-8')
+    pool = ValuePool()
+
+    items = parse_pricelist(str(path), value_pool=pool)
+
+    assert items[0].quantity is items[1].quantity
+    assert set(pool.values) == {'в наличии'}
+    assert pool.to_dict()['hits'] == 1
+
+
+def test_parser_shared_value_pool(current_path, tmp_path):
+    pool = ValuePool()
+    parser = PricelistParser(value_pool=pool, cache=PricelistCache(str(tmp_path)))
+
+    parser.add_data_source(current_path + '/samples/sample.xlsx', slug='first')
+    misses = pool.misses
+    parser.add_data_source(current_path + '/samples/sample.xls', slug='second')
+
+    # Во втором файле те же строки, поэтому новых значений в пуле почти нет
+    assert pool.misses - misses < misses
+    assert parser.data_sources['second'].value_pool is pool
+    assert parser.data_sources['second'].stats.counters['pool_hits'] > 0
+
+
+def test_intern_values_sheet_workers(current_path):
+    stats = ParseStats()
+    items = parse_pricelist(current_path + '/samples/sample.xlsx', value_pool=ValuePool(), sheet_workers=2, stats=stats)
+
+    assert len(items) == 679
+    assert stats.counters['pool_hits'] > 0
@@ -0,0 +1,103 @@
+import codecs
+import io
+import mmap
+import pytest
+
+from pricelist_parser import parse_pricelist
+from pricelist_parser.sources import MappedFile, detect_encoding, open_text, read_head, sniff_file_type
+
+
+@pytest.mark.parametrize('sample, expected', [
+    ['sample.xls', 'xls'],
+    ['sample.xlsx', 'xlsx'],
+    ['sample.csv', 'csv'],
+    ['cp154_encoded.csv', 'csv'],
+    ['sample.docx', None],
+])
+def test_sniff_file_type(current_path, sample, expected):
+    path = current_path + '/samples/' + sample
+
+    with open(path, 'rb') as file_object:
+        content = file_object.read()
+        file_object.seek(0)
+
+        assert sniff_file_type(path) == expected
+        assert sniff_file_type(content) == expected
+        assert sniff_file_type(file_object) == expected
+        assert file_object.tell() == 0
+
+
+def test_sniff_file_type_text_objects():
+    assert sniff_file_type(io.StringIO('Артикул,Цена\n')) == 'csv'
+    assert sniff_file_type(b'') is None
+    assert sniff_file_type(b'\x00\x01\x02') is None
+
+
+@pytest.mark.parametrize('encoding', ['utf-16', 'utf-16-be', 'utf-32'])
+def test_sniff_file_type_wide_encodings(encoding):
+    content = 'Артикул,Цена\n123,100\n'.encode(encoding)
+
+    # Без метки BOM текст в UTF-16 не отличить от двоичного файла
+    if encoding == 'utf-16-be':
+        content = codecs.BOM_UTF16_BE + content
+
+    assert sniff_file_type(content) == 'csv'
+    assert [item.sku for item in parse_pricelist(content, encoding='auto')] == ['123']
+
+
+def test_read_head_keeps_position():
+    file_object = io.BytesIO(b'0123456789')
+    file_object.seek(5)
+
+    assert read_head(file_object, 3) == b'012'
+    assert file_object.tell() == 5
+
+
+def test_mapped_file(current_path):
+    with open(current_path + '/samples/sample.csv', 'rb') as file_object:
+        expected = file_object.read()
+        mapped = mmap.mmap(file_object.fileno(), 0, access=mmap.ACCESS_READ)
+
+    mapped_file = MappedFile(mapped, owns_mapping=False)
+
+    assert mapped_file.read() == expected
+    assert mapped_file.seek(3) == 3
+    assert mapped_file.read(2) == expected[3:5]
+
+    mapped_file.close()
+
+    assert mapped.closed is False
+
+    mapped.close()
+
+
+@pytest.mark.parametrize('use_mmap', [False, True])
+def test_open_text_from_path(current_path, use_mmap):
+    with open_text(current_path + '/samples/sample.csv', encoding='utf-8', use_mmap=use_mmap) as file_object:
+        assert file_object.readline().startswith('Артикул,')
+
+
+def test_open_text_does_not_close_foreign_objects():
+    file_object = io.BytesIO('Артикул,Цена\n'.encode('cp1251'))
+
+    with open_text(file_object, encoding='cp1251') as text:
+        assert text.read() == 'Артикул,Цена\n'
+
+    assert file_object.closed is False
+
+
+@pytest.mark.parametrize('encoding, expected', [
+    ['utf-8', 'utf-8'],
+    ['utf-8-sig', 'utf-8-sig'],
+    ['utf-16', 'utf-16'],
+    ['utf-32', 'utf-32'],
+    ['cp1251', 'cp1251'],
+    ['koi8_r', 'koi8_r'],
+    ['cp866', 'cp866'],
+])
+def test_detect_encoding(encoding, expected):
+    sample = 'Артикул;Наименование;Цена\n123;Сепулька обычная;100\n'.encode(encoding)
+
+    assert detect_encoding(sample) == expected
+    # Образец может обрываться посреди символа
+    assert detect_encoding(sample[:-4]) == expected
@@ -0,0 +1,57 @@
+import pickle
+import pytest
+
+from pricelist_parser import ParseStats, PricelistParser, XlsExtruder, parse_pricelist
+
+
+@pytest.mark.parametrize('sample', ['sample.xls', 'sample.xlsx'])
+def test_parse_stats(current_path, sample):
+    extruder = PricelistParser().add_data_source(source_file=current_path + '/samples/' + sample, slug='sample')
+    stats = extruder.stats
+
+    assert set(stats.timings.keys()) == {'load_file', 'detect_headers', 'select_best_headers', 'extract', 'price_parse'}
+    assert stats.timings['price_parse'] > 0
+    assert stats.counters['price_parse_samples'] > 0
+    assert stats.counters['items'] == 679
+    assert stats.counters['rows_rejected'] == sum(stats.rejected.values())
+    assert stats.rejected == {'missing_price': 154}
+
+    sheet = stats.sheets['Лист с данными']
+    assert sheet['counters']['items'] == 9
+    assert sheet['counters']['rows_scanned'] == 16
+    assert sum(sheet['counters']['items'] for sheet in stats.sheets.values() if 'items' in sheet['counters']) == 679
+
+
+def test_price_parse_every_row(current_path):
+    extruder = XlsExtruder(current_path + '/samples/sample.xls')
+    extruder.price_sample_every = 1
+    extruder.load_data()
+
+    counters = extruder.stats.counters
+
+    assert counters['price_parse_samples'] == counters['items'] + counters['rows_rejected']
+    assert [dict(item) for item in extruder.items] == [dict(item) for item in parse_pricelist(current_path + '/samples/sample.xls')]
+
+
+def test_parse_stats_hooks(current_path):
+    stages = []
+    stats = ParseStats(hooks=[lambda stage, seconds, sheet_name: stages.append((stage, sheet_name))])
+
+    items = parse_pricelist(current_path + '/samples/sample.csv', stats=stats)
+
+    assert len(items) == 4
+    assert stats.counters['items'] == 4
+    assert stages[0] == ('load_file', None)
+    assert ('extract', 'default') in stages
+
+    # Функции обратного вызова в другой процесс не передаются
+    assert pickle.loads(pickle.dumps(stats)).hooks == []
+
+
+def test_parse_stats_sheet_workers(current_path):
+    sequential = PricelistParser().add_data_source(source_file=current_path + '/samples/sample.xls', slug='sample').stats
+    concurrent = PricelistParser().add_data_source(source_file=current_path + '/samples/sample.xls', slug='sample', sheet_workers=2).stats
+
+    assert concurrent.counters == sequential.counters
+    assert concurrent.rejected == sequential.rejected
+    assert concurrent.sheets.keys() == sequential.sheets.keys()
@@ -0,0 +1,157 @@
+import pytest
+import zipfile
+from datetime import datetime
+from openpyxl import Workbook, load_workbook
+
+from pricelist_parser import XlsxExtruder, parse_pricelist
+from pricelist_parser.xlsx_reader import XlsxReader, column_index
+
+SHEET_XML = '''<?xml version="1.0" encoding="UTF-8"?>
+<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">
+<sheetData>
+<row r="1"><c r="A1" t="inlineStr"><is><t>Артикул</t></is></c><c r="C1" t="inlineStr"><is><r><t>Це</t></r><r><t>на</t></r></is></c></row>
+<row r="3"><c r="A3" t="inlineStr"><is><t>123-А</t></is></c><c r="B3" t="b"><v>1</v></c><c r="C3"><v>1.5E3</v></c></row>
+</sheetData>
+</worksheet>'''
+
+WORKBOOK_XML = '''<?xml version="1.0" encoding="UTF-8"?>
+<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"
+ xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">
+<sheets><sheet name="Прайс" sheetId="1" r:id="rId1"/></sheets>
+</workbook>'''
+
+RELATIONSHIPS_XML = '''<?xml version="1.0" encoding="UTF-8"?>
+<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">
+<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet"
+ Target="worksheets/sheet1.xml"/>
+<Relationship Id="rId2" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/sharedStrings"
+ Target="sharedStrings.xml"/>
+</Relationships>'''
+
+MAIN_NS = 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'
+
+
+def write_xlsx(path, sheet_xml, shared_strings_xml=None):
+    with zipfile.ZipFile(path, 'w') as archive:
+        archive.writestr('xl/workbook.xml', WORKBOOK_XML)
+        archive.writestr('xl/_rels/workbook.xml.rels', RELATIONSHIPS_XML)
+        archive.writestr('xl/worksheets/sheet1.xml', sheet_xml)
+
+        if shared_strings_xml is not None:
+            archive.writestr('xl/sharedStrings.xml', shared_strings_xml)
+
+    return str(path)
+
+
+def is_formula(value):
+    return isinstance(value, str) and value.startswith('=')
+
+
+@pytest.fixture()
+def inline_xlsx_file(tmp_path):
+    # Книга без общих строк, стилей и размера листа – так пишут xlsx некоторые выгрузки из учетных систем
+    return write_xlsx(tmp_path / 'inline.xlsx', SHEET_XML)
+
+
+@pytest.mark.parametrize('reference, expected', [
+    ['A1', 1],
+    ['Z10', 26],
+    ['AA3', 27],
+    ['XFD1048576', 16384],
+])
+def test_column_index(reference, expected):
+    assert column_index(reference) == expected
+
+
+def test_xlsx_reader_rows_match_openpyxl(current_path):
+    path = current_path + '/samples/sample.xlsx'
+    reader = XlsxReader(open(path, 'rb'))
+    wb = load_workbook(path, read_only=True)
+
+    try:
+        assert reader.sheetnames == wb.sheetnames
+
+        for name in wb.sheetnames:
+            assert (reader[name].max_row, reader[name].max_column) == (wb[name].max_row, wb[name].max_column)
+
+            for kwargs in [{}, {'min_row': 3, 'max_row': 10, 'min_col': 2, 'max_col': 4}]:
+                rows = list(reader[name].iter_rows(values_only=True, **kwargs))
+                expected = list(wb[name].iter_rows(values_only=True, **kwargs))
+
+                assert len(rows) == len(expected)
+
+                # Вместо формул XML-движок отдает их последние вычисленные значения
+                for row, expected_row in zip(rows, expected):
+                    assert [value for value, expected_value in zip(row, expected_row) if not is_formula(expected_value)] == \
+                        [value for value in expected_row if not is_formula(value)]
+    finally:
+        reader.close()
+        wb.close()
+
+
+def test_xlsx_reader_inline_strings(inline_xlsx_file):
+    reader = XlsxReader(open(inline_xlsx_file, 'rb'))
+    ws = reader['Прайс']
+
+    assert ws.max_row is None
+    assert list(ws.iter_rows(values_only=True)) == [('Артикул', None, 'Цена'), (), ('123-А', True, 1500.0)]
+    assert ws.cell(row=3, column=1).value == '123-А'
+    assert ws.cell(row=5, column=1).value is None
+
+
+def test_xlsx_reader_dates(tmp_path):
+    path = str(tmp_path / 'dates.xlsx')
+    wb = Workbook()
+    wb.active.append(['Дата', datetime(2020, 5, 17, 12, 30), 43000])
+    wb.save(path)
+
+    reader = XlsxReader(open(path, 'rb'))
+
+    assert list(reader[wb.active.title].iter_rows(values_only=True)) == [('Дата', datetime(2020, 5, 17, 12, 30), 43000)]
+
+
+def test_xlsx_reader_reads_shared_strings_lazily(tmp_path):
+    rows = ''.join(f'<row r="{idx + 1}"><c r="A{idx + 1}" t="s"><v>{idx}</v></c></row>' for idx in range(1000))
+    strings = ''.join(f'<si><t>Сепулька {idx}</t></si>' for idx in range(1000))
+    path = write_xlsx(
+        tmp_path / 'strings.xlsx',
+        f'<worksheet xmlns="{MAIN_NS}"><sheetData>{rows}</sheetData></worksheet>',
+        f'<sst xmlns="{MAIN_NS}">{strings}</sst>',
+    )
+
+    reader = XlsxReader(open(path, 'rb'))
+
+    assert reader['Прайс'].cell(row=2, column=1).value == 'Сепулька 1'
+    assert len(reader.shared_strings.strings) == 2
+    assert reader['Прайс'].cell(row=1000, column=1).value == 'Сепулька 999'
+
+
+def test_xlsx_xml_engine_items_match_openpyxl(current_path):
+    path = current_path + '/samples/sample.xlsx'
+    items = parse_pricelist(path)
+
+    assert [item.data for item in parse_pricelist(path, engine='xml')] == [item.data for item in items]
+    assert len(parse_pricelist(path, engine='xml', sheet_workers=2)) == len(items)
+
+
+def test_xlsx_xml_engine_headers_map(current_path):
+    path = current_path + '/samples/sample.xlsx'
+    extruder = XlsxExtruder(path)
+    headers_map = extruder.get_headers_map(extruder.load_file(path, engine='xml'))
+    extruder.close()
+
+    expected_extruder = XlsxExtruder(path)
+    expected = expected_extruder.get_headers_map(expected_extruder.load_file(path))
+
+    assert [(x['sheet_name'], x['headers']) for x in headers_map] == [(x['sheet_name'], x['headers']) for x in expected]
+
+
+def test_xlsx_xml_engine_worksheet_names(current_path):
+    extruder = XlsxExtruder(current_path + '/samples/sample.xlsx')
+
+    assert extruder.get_source_worksheet_names(engine='xml') == ['Лист с заголовком', 'Лист с данными', 'Лист с данными –\xa02']
+
+
+def test_xlsx_unknown_engine(current_path):
+    with pytest.raises(ValueError):
+        XlsxExtruder().load_file(current_path + '/samples/sample.xlsx', engine='pandas')